@@ -0,0 +1,49 @@
+import subprocess
+import sys
+from typing import List, Tuple
+
+# what bot.py imports, the bot itself connects to discord when imported
+modules = sys.argv[1:] or ['bot.EventHandler']
+# must only be imported once the predictor is activated
+deferredPackages = ['tensorflow', 'keras', 'pandas']
+top = 15
+
+
+def measureImports(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Import a module in a new interpreter with -X importtime.
+
+    :return: The name, own time and cumulative time in microseconds of every imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True
+    )
+    if result.returncode:
+        print(result.stderr.strip().splitlines()[-1])
+        sys.exit(result.returncode)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        selfTime, cumulativeTime, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(selfTime), int(cumulativeTime)))
+    return imports
+
+
+failed = False
+for module in modules:
+    imports = measureImports(module)
+    total = next(cumulative for name, _, cumulative in imports if name == module)
+    print(f'{module}: {total / 1e6:.2f}s, {len(imports)} modules')
+    topLevel = {}
+    for name, _, cumulative in imports:
+        # the cumulative time of a package already contains its submodules
+        if '.' not in name:
+            topLevel[name] = cumulative
+    for name, cumulative in sorted(topLevel.items(), key=lambda item: -item[1])[:top]:
+        print(f'  {name:<30}{cumulative / 1e3:>10.1f} ms')
+    deferred = sorted(set(name.split('.')[0] for name, _, _ in imports) & set(deferredPackages))
+    if deferred:
+        failed = True
+        print(f'  Imports {", ".join(deferred)}, which should only be imported when the predictor is activated')
+sys.exit(1 if failed else 0)
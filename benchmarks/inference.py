@@ -0,0 +1,199 @@
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import tensorflow as tf
+
+from learn.BatchDecoder import BatchDecoder
+from learn.NumpyPredictor import NumpyPredictor
+from learn.SavedModelPredictor import SavedModelPredictor
+from learn.TrustedRNN import TrustedRNN
+from utils.configReader import readConfig
+from utils.setupLogger import setupLogger
+
+config = readConfig()
+logger = setupLogger('ai', level='WARNING')
+
+modelTypes = ['GRU_1layer', 'GRU_2layer', 'LSTM_1layer', 'LSTM_multilayer', 'BiLSTM_multilayer']
+paths = ['loop', 'compiled', 'numpy', 'int8', 'savedmodel']
+# the paths running the exported NumPy weights
+numpyPaths = ['numpy', 'int8']
+unitSizes = [256, 512, 1024]
+# only used by the multilayer models
+layerCounts = [2, 4]
+
+if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+    print('Usage: python -m benchmarks.inference [messages] [modelType ...]')
+    print(f'Available model types: {modelTypes}')
+    sys.exit(1)
+
+messages = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+selectedTypes = sys.argv[2:] or modelTypes
+maxBatchSize = config['prediction']['batching']['maxBatchSize']
+batchSizes = [2 ** i for i in range(maxBatchSize.bit_length()) if 2 ** i <= maxBatchSize]
+maxLength = 200
+firstTokenRepeats = 10
+seed = '\n'
+outputFile = f'inference-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+
+# printable characters, the weights are random so only the shapes matter
+vocab = sorted(set(chr(i) for i in range(32, 127)) | {'\n'})
+
+
+def makeModel(path: str, modelType: str, nUnits: int, layers: int) -> TrustedRNN:
+    """
+    Build a model with random weights.
+    """
+    rnn = TrustedRNN(
+        vocab, modelType=modelType, nUnits=nUnits, layers=layers, maxPredictionLength=maxLength,
+        compiledDecode=path == 'compiled',
+    )
+    rnn.makeModel()
+    return rnn
+
+
+def exportModel(path: str, modelType: str, nUnits: int, layers: int, directory: str) -> Optional[str]:
+    """
+    Export a model with random weights for the paths that load an exported model, like the bot does.
+
+    :return: The exported file or directory, None for the paths that build the model.
+    """
+    if path in ['loop', 'compiled']:
+        return None
+    rnn = makeModel(path, modelType, nUnits, layers)
+    fileName = os.path.join(directory, f'{modelType}_{nUnits}_{layers}_{path}')
+    if path == 'savedmodel':
+        rnn.exportSavedModel(fileName)
+        return fileName
+    rnn.exportNumpyWeights(f'{fileName}.npz', quantize=path == 'int8')
+    return f'{fileName}.npz'
+
+
+def makeEngine(path: str, modelType: str, nUnits: int, layers: int, fileName: Optional[str]) -> BatchDecoder:
+    """
+    Make the engine of an inference path, loading the exported model if there is one.
+    """
+    if path == 'savedmodel':
+        return SavedModelPredictor(fileName, maxPredictionLength=maxLength)  # type: ignore
+    if path in numpyPaths:
+        engine = NumpyPredictor(fileName, maxPredictionLength=maxLength)  # type: ignore
+        engine.rng = np.random.default_rng(0)
+        return engine
+    rnn = makeModel(path, modelType, nUnits, layers)
+    rnn.makePredictor()
+    return rnn
+
+
+def timeFirstToken(engine: BatchDecoder, path: str) -> float:
+    """
+    Median time to feed the seed and sample the first character of a single message.
+    """
+    times = []
+    for _ in range(firstTokenRepeats):
+        rows = engine.makeRows(seed)
+        start = time.perf_counter()
+        if path == 'compiled':
+            engine.maxPredictionLength = 1
+            engine.decode(rows)
+            engine.maxPredictionLength = maxLength
+        else:
+            engine.startRows(rows)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def timeBatches(engine: BatchDecoder, batchSize: int) -> Dict[str, Any]:
+    """
+    Generate the messages in batches of batchSize. Every message waits for its whole batch.
+    """
+    # the first batch of a new size traces the graphs again
+    engine.predictBatch([seed] * batchSize)
+    latencies, chars, elapsed = [], 0, 0.0
+    for _ in range(max(1, messages // batchSize)):
+        start = time.perf_counter()
+        results = engine.predictBatch([seed] * batchSize)
+        duration = time.perf_counter() - start
+        elapsed += duration
+        chars += sum(len(result) for result in results)
+        latencies += [duration] * batchSize
+    return {
+        'batchSize': batchSize,
+        'messages': len(latencies),
+        'charsPerSecond': chars / elapsed,
+        'p50Seconds': float(np.percentile(latencies, 50)),
+        'p99Seconds': float(np.percentile(latencies, 99)),
+    }
+
+
+def measure(makeEngine: Callable[[], BatchDecoder], path: str) -> Dict[str, Any]:
+    """
+    Time making the engine and generating the first message, then the first character and the batches.
+    """
+    start = time.perf_counter()
+    engine = makeEngine()
+    engine.predictBatch(seed)
+    result: Dict[str, Any] = {'coldStartSeconds': time.perf_counter() - start}
+    result['firstTokenSeconds'] = timeFirstToken(engine, path)
+    result['batches'] = [timeBatches(engine, batchSize) for batchSize in batchSizes]
+    return result
+
+
+tf.random.set_seed(0)
+results: List[Dict[str, Any]] = []
+print(f'{messages} messages per batch size, batch sizes {batchSizes}, at most {maxLength} characters')
+print(f'{"model":<18}{"units":>6}{"layers":>7}  {"path":<10}{"cold s":>8}{"first ms":>10}'
+      f'{"batch":>7}{"chars/s":>10}{"p50 s":>8}{"p99 s":>8}')
+with TemporaryDirectory() as directory:
+    for modelType in selectedTypes:
+        layerGrid = layerCounts if modelType in ['LSTM_multilayer', 'BiLSTM_multilayer'] else [1]
+        for nUnits in unitSizes:
+            for layers in layerGrid:
+                for path in paths:
+                    if path in numpyPaths and modelType not in NumpyPredictor.supportedModelTypes:
+                        continue
+                    entry: Dict[str, Any] = {'modelType': modelType, 'nUnits': nUnits, 'layers': layers, 'path': path}
+                    name = f'{modelType:<18}{nUnits:>6}{layers:>7}  {path:<10}'
+                    error: Optional[Exception] = None
+                    try:
+                        # exporting isn't part of the cold start, the bot loads models that are already exported
+                        fileName = exportModel(path, modelType, nUnits, layers, directory)
+                        entry.update(
+                            measure(lambda: makeEngine(path, modelType, nUnits, layers, fileName), path)
+                        )
+                    except Exception as err:
+                        error = err
+                        entry['error'] = f'{type(err).__name__}: {err}'
+                    results.append(entry)
+                    if error:
+                        print(f'{name}{"failed":>8}  {type(error).__name__}')
+                        continue
+                    for i, batch in enumerate(entry['batches']):
+                        prefix = f'{name}{entry["coldStartSeconds"]:>8.2f}{entry["firstTokenSeconds"] * 1000:>10.2f}'
+                        print(
+                            f'{prefix if i == 0 else " " * len(prefix)}{batch["batchSize"]:>7}'
+                            f'{batch["charsPerSecond"]:>10.0f}{batch["p50Seconds"]:>8.2f}{batch["p99Seconds"]:>8.2f}'
+                        )
+
+summary = {
+    'date': datetime.now().isoformat(timespec='seconds'),
+    'environment': {
+        'python': platform.python_version(),
+        'tensorflow': tf.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpuCount': os.cpu_count(),
+        'gpus': len(tf.config.list_physical_devices('GPU')),
+    },
+    'settings': {'messages': messages, 'batchSizes': batchSizes, 'maxLength': maxLength, 'seed': seed},
+    'results': results,
+}
+with open(outputFile, 'w', encoding='utf-8') as f:
+    json.dump(summary, f, indent=4)
+print(f'Results written to {outputFile}')
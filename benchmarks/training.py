@@ -0,0 +1,56 @@
+import sys
+import time
+
+import numpy as np
+
+from learn.TrustedRNN import TrustedRNN
+from utils.configReader import readConfig
+from utils.setupLogger import setupLogger
+
+config = readConfig()
+logger = setupLogger('ai', level='WARNING')
+
+modelTypes = ['GRU_1layer', 'GRU_2layer', 'LSTM_1layer', 'LSTM_multilayer', 'BiLSTM_multilayer']
+
+if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+    print('Usage: python -m benchmarks.training [steps] [modelType ...]')
+    print(f'Available model types: {modelTypes}')
+    sys.exit(1)
+
+steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+selectedTypes = sys.argv[2:] or modelTypes
+warmupSteps = 3
+
+# random data, only the shapes matter for the speed
+vocab = [chr(i) for i in range(32, 127)]
+batchSize = config['learn']['training']['batchSize']
+seqLength = config['learn']['model']['seqLength']
+ids = np.random.default_rng(0).integers(
+    1, len(vocab) + 1, (warmupSteps + steps) * batchSize * (seqLength + 1) * 2, dtype=np.uint8
+)
+
+mixedPolicy = TrustedRNN(vocab, mixedPrecision='auto').getPrecisionPolicy()
+if mixedPolicy == 'float32':
+    # no native support, still measured to see the emulation cost
+    mixedPolicy = 'mixed_bfloat16'
+variants = [('float32', '', False), ('float32 + XLA', '', True), (mixedPolicy, mixedPolicy, False)]
+variants.append((f'{mixedPolicy} + XLA', mixedPolicy, True))
+
+print(f'{steps} steps, batch size {batchSize}, sequence length {seqLength}')
+print(f'{"model":<20}{"variant":<28}{"steps/sec":>10}{"speedup":>10}')
+for modelType in selectedTypes:
+    baseline = None
+    for name, mixedPrecision, jitCompile in variants:
+        try:
+            rnn = TrustedRNN(vocab, ids=ids, modelType=modelType, mixedPrecision=mixedPrecision, jitCompile=jitCompile)
+            rnn.makeDataset()
+            rnn.makeModel()
+            rnn.model.fit(rnn.dataset.take(warmupSteps), verbose=0)  # type: ignore
+            start = time.perf_counter()
+            rnn.model.fit(rnn.dataset.skip(warmupSteps).take(steps), verbose=0)  # type: ignore
+            stepsPerSecond = steps / (time.perf_counter() - start)
+        except Exception as err:
+            print(f'{modelType:<20}{name:<28}{"failed":>10}  {type(err).__name__}')
+            continue
+        baseline = baseline or stepsPerSecond
+        print(f'{modelType:<20}{name:<28}{stepsPerSecond:>10.2f}{stepsPerSecond / baseline:>9.2f}x')
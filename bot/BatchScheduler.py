@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+from learn.BatchDecoder import BatchDecoder
+from learn.GeneratedMessage import GeneratedMessage
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.bot.batchscheduler')
+
+Request = Tuple[str, Optional[float], Future]
+
+
+class BatchScheduler:
+    """
+    Continuous batching for a single model. Concurrent requests are stepped together one character at a time,
+    new requests join the running batch between steps and every request is released as soon as its row finishes.
+    When stopped, the requests that were already submitted are still generated before the thread exits.
+    """
+    def __init__(
+        self,
+        model: BatchDecoder,
+        name: str,
+        maxBatchSize: int,
+        maxWaitTime: float,
+        onIdle: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.model = model
+        self.name = name
+        self.maxBatchSize = maxBatchSize
+        self.maxWaitTime = maxWaitTime
+        # called once all submitted requests are finished
+        self.onIdle = onIdle
+        self.requests: 'queue.Queue[Optional[Request]]' = queue.Queue()
+        self.running = True
+        # submitted requests that are not finished yet
+        self.unfinished = 0
+        # keeps requests from being queued after the scheduler stopped
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name=f'scheduler-{name}', daemon=True)
+        self.thread.start()
+
+    def submit(self, seed: str, temperature: Optional[float]) -> Future:
+        """
+        Queue a prediction, the returned future resolves to the generated text.
+        """
+        future: Future = Future()
+        with self.lock:
+            if self.running:
+                self.unfinished += 1
+                future.add_done_callback(self.finished)
+                self.requests.put((seed, temperature, future))
+            else:
+                future.set_exception(RuntimeError(f'Batch scheduler of {self.name} is stopped.'))
+        return future
+
+    def stop(self) -> None:
+        """
+        Stop accepting requests, the thread exits once the submitted ones are finished.
+        """
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            self.requests.put(None)
+
+    def finished(self, _: Future) -> None:
+        with self.lock:
+            self.unfinished -= 1
+            idle = not self.unfinished
+        if idle and self.onIdle:
+            self.onIdle()
+
+    def isIdle(self) -> bool:
+        """
+        Whether no request is queued or being generated.
+        """
+        return not self.unfinished
+
+    def takeRequests(self, count: int, block: bool) -> List[Request]:
+        """
+        Take up to count requests from the queue. When blocking, wait for a first request
+        and then up to maxWaitTime for more to arrive, so they can start as one batch.
+        """
+        requests: List[Request] = []
+        deadline = 0.0
+        while len(requests) < count:
+            try:
+                if not block:
+                    request = self.requests.get_nowait()
+                elif not requests:
+                    request = self.requests.get()
+                else:
+                    request = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if request is None:
+                break
+            # skip requests that were cancelled while waiting
+            if not request[2].set_running_or_notify_cancel():
+                continue
+            requests.append(request)
+            if len(requests) == 1:
+                deadline = time.monotonic() + self.maxWaitTime
+        return requests
+
+    def run(self) -> None:
+        rows: List[GeneratedMessage] = []
+        futures: List[Future] = []
+        chars: List[str] = []
+        states: Any = None
+        # the banned word automaton state of every row
+        automatonStates: Any = None
+        bannedWords = self.model.bannedWords
+        while self.running or rows or not self.requests.empty():
+            newRequests = self.takeRequests(self.maxBatchSize - len(rows), block=not rows and self.running)
+            try:
+                if newRequests:
+                    newRows = [self.model.makeRows(seed, temperature)[0] for seed, temperature, _ in newRequests]
+                    newAutomatonStates = None
+                    if bannedWords:
+                        newAutomatonStates = bannedWords.startStates([row.seed for row in newRows])
+                    newChars, newStates = self.model.startRows(newRows, newAutomatonStates)
+                    states = newStates if not rows else self.model.concatStates([states, newStates])
+                    if bannedWords:
+                        automatonStates = (
+                            newAutomatonStates if not rows else np.concatenate([automatonStates, newAutomatonStates])
+                        )
+                    rows += newRows
+                    futures += [future for *_, future in newRequests]
+                    chars += newChars
+                if not rows:
+                    continue
+
+                keep = []
+                for i, (row, char) in enumerate(zip(rows, chars)):
+                    if row.append(char):
+                        logger.debug(f'{colorize("Prediction:", "OKGREEN")} {colorize(row.getText(), "OKCYAN")}')
+                        futures[i].set_result(row.getText())
+                    else:
+                        keep.append(i)
+                if bannedWords:
+                    automatonStates = bannedWords.step(automatonStates, chars)
+                if len(keep) < len(rows):
+                    rows = [rows[i] for i in keep]
+                    futures = [futures[i] for i in keep]
+                    chars = [chars[i] for i in keep]
+                    states = self.model.selectStates(states, keep) if keep else None
+                    if bannedWords:
+                        automatonStates = automatonStates[keep]
+                if rows:
+                    chars, states = self.model.stepRows(
+                        chars, states, [row.temperature for row in rows], self.model.getMasks(automatonStates)
+                    )
+            except Exception as err:
+                logger.error(colorize(f'Batch of {self.name} failed: {err}', 'FAIL'))
+                for future in futures + [future for *_, future in newRequests]:
+                    if not future.done():
+                        future.set_exception(err)
+                rows, futures, chars, states, automatonStates = [], [], [], None, None
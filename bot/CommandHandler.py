@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import datetime
 import traceback
@@ -7,7 +8,7 @@ from typing import List, Union
 import regex as re
 import discord
 
-from bot.PredictionGetter import PredictionGetter
+from bot.PredictionGetter import PredictionGetter, QueueFullError
 from bot.MessageLogger import MessageLogger
 from utils.colorizer import colorize
 from utils.configReader import readConfig
@@ -113,7 +114,8 @@ class CommandHandler:
             reply: discord.Message = await message.reply(self.strings['predictor.activating'], mention_author=False)
             if not self.activatePredictor:
                 self.activatePredictor = True
-                self.predictionGetter.activate()
+                # loading models takes a while, keep the event loop free
+                await asyncio.get_running_loop().run_in_executor(None, self.predictionGetter.activate)
 
             await reply.delete()
             return await message.reply(self.strings['predictor.activated'], mention_author=False)
@@ -148,12 +150,13 @@ class CommandHandler:
             splitMessage.append('\n')
         seed = ' '.join(splitMessage)
         try:
-            prediction: str = self.predictionGetter.predict(modelName, seed, temperature)
+            prediction: str = await self.predictionGetter.predictAsync(modelName, seed, temperature)
 
             if re.match(r'[a-zA-Z0-9_]+:\d{18}>', prediction):
                 prediction = '<:' + prediction
             if re.match(r'@', prediction):
                 prediction = '<' + prediction
+            # banned words are never generated, but the seed can contain them
             for word in config['prediction']['bannedWords']:
                 if prediction.find(word) != -1:
                     return await message.reply(self.strings['commandHandler.bannedWord'], mention_author=False)
@@ -166,6 +169,12 @@ class CommandHandler:
             )
             # FIXME prevent sending empty message
             return await message.reply(prediction, mention_author=False)
+        except QueueFullError:
+            logger.warning(colorize('Prediction queue full, request dropped', 'WARNING'))
+            return await message.reply(self.strings['commandHandler.predictionBusy'], mention_author=False)
+        except asyncio.TimeoutError:
+            logger.warning(colorize(f'Prediction from {modelName} timed out', 'WARNING'))
+            return await message.reply(self.strings['commandHandler.predictionTimeout'], mention_author=False)
         except Exception:
             logger.error(colorize(traceback.format_exc(), 'FAIL'))
             return await message.reply(self.strings['commandHandler.predictionError'], mention_author=False)
@@ -182,6 +191,11 @@ class CommandHandler:
         embed = discord.Embed(title='Available models', color=discord.Color.dark_orange())
         if not self.activatePredictor:
             embed.description = 'Predictor is currently inactive. Mald at breeeze to activate.'
+        elif self.predictionGetter.useProcesses:
+            # the models live in the worker processes
+            embed.description = 'Models are loaded by the prediction processes, loaded models are not shown.'
         for name, desc in zip(modelNames, modelDesc):
+            if self.predictionGetter.isResident(name):
+                name += ' (loaded)'
             embed.add_field(name=name, value=desc)
         return await message.reply(embed=embed, mention_author=False)
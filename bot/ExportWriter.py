@@ -0,0 +1,98 @@
+import atexit
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from itertools import groupby
+from typing import List, Optional, Tuple
+
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.bot.exportwriter')
+
+Row = Tuple[str, List[str]]
+
+
+class ExportWriter:
+    """
+    Writes the rows of logged messages to their export files on a background thread, in batches.
+    Rows are flushed once bufferSize of them are waiting, every flushInterval seconds and when the writer stops.
+    """
+    header = ['ID', 'Timestamp', 'ChannelID', 'AuthorID', 'Contents', 'Attachments']
+
+    def __init__(self, bufferSize: int, flushInterval: float) -> None:
+        self.bufferSize = bufferSize
+        self.flushInterval = flushInterval
+        self.rows: 'queue.Queue[Optional[Row]]' = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='exportwriter', daemon=True)
+        self.thread.start()
+        # flush the remaining rows when the bot exits
+        atexit.register(self.stop)
+
+    def write(self, fileName: str, row: List[str]) -> None:
+        """
+        Queue a row to be written to a file, never blocks.
+
+        :param str fileName: The export file, the header is written first if it doesn't exist yet.
+        :param row: The values of the row, in the order of the header.
+        """
+        self.rows.put((fileName, row))
+
+    def stop(self) -> None:
+        """
+        Flush the remaining rows and stop the thread.
+        """
+        if self.thread.is_alive():
+            self.rows.put(None)
+            self.thread.join()
+        atexit.unregister(self.stop)
+
+    def run(self) -> None:
+        buffer: List[Row] = []
+        stopped = False
+        deadline = time.monotonic() + self.flushInterval
+        while not stopped:
+            try:
+                row = self.rows.get(timeout=max(0.0, deadline - time.monotonic()))
+                if row is None:
+                    stopped = True
+                else:
+                    buffer.append(row)
+            except queue.Empty:
+                pass
+            if stopped or len(buffer) >= self.bufferSize or time.monotonic() >= deadline:
+                self.flush(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flushInterval
+        self.close()
+
+    def flush(self, rows: List[Row]) -> None:
+        """
+        Write rows to their files, consecutive rows of the same file are written at once.
+        """
+        for fileName, fileRows in groupby(rows, key=lambda row: row[0]):
+            values = [row for _, row in fileRows]
+            try:
+                self.writeRows(fileName, values)
+                logger.debug(f'Wrote {len(values)} messages to {fileName}')
+            except Exception as err:
+                logger.warning(colorize(f'Failed to write {len(values)} messages to {fileName}: {err}', 'WARNING'))
+
+    def writeRows(self, fileName: str, rows: List[List[str]]) -> None:
+        """
+        Append rows to a csv file.
+        """
+        isNew = not os.path.exists(fileName)
+        with open(fileName, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            if isNew:
+                writer.writerow(self.header)
+            writer.writerows(rows)
+
+    def close(self) -> None:
+        """
+        Release the resources of the writer, runs on the writer thread after the last flush.
+        """
+        pass
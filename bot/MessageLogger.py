@@ -1,9 +1,11 @@
 import datetime
-import os
 import logging
+from typing import Optional
 
 import discord
 
+from bot.ExportWriter import ExportWriter
+from bot.SQLiteExportWriter import SQLiteExportWriter
 from utils.colorizer import colorize
 from utils.configReader import readConfig
 from utils.snowflakeConverter import convertSnowflake
@@ -15,15 +17,24 @@ logger = logging.getLogger('ai.bot.messagelogger')
 
 class MessageLogger:
     active: bool = False
+    writer: Optional[ExportWriter] = None
 
     @classmethod
     def activate(cls) -> None:
         cls.active = True
+        if not cls.writer:
+            writerClass = SQLiteExportWriter if config['bot']['messageLogger']['backend'] == 'sqlite' else ExportWriter
+            cls.writer = writerClass(
+                config['bot']['messageLogger']['bufferSize'], config['bot']['messageLogger']['flushInterval']
+            )
         logger.info(f'{colorize("MessageLogger", "OKBLUE")} is {colorize("active", "GREEN")}')
 
     @classmethod
     def deactivate(cls) -> None:
         cls.active = False
+        if cls.writer:
+            cls.writer.stop()
+            cls.writer = None
         logger.info(f'{colorize("MessageLogger", "OKBLUE")} is {colorize("inactive", "RED")}')
 
     @classmethod
@@ -33,18 +44,15 @@ class MessageLogger:
         try:
             if not message.content or message.content.startswith('ai.'):
                 return
-            filename = cls.getFileName()
-            if not os.path.exists(filename):
-                with open(filename, 'w') as f:
-                    f.write('ID,Timestamp,ChannelID,AuthorID,Contents,Attachments\n')
             timestamp = convertSnowflake(message.id).strftime('%Y-%m-%d %H:%M:%S.%f%z')
-            content: str = message.content.replace('"', '""')
             channelID = str(message.channel.id)
             authorID = str(message.author.id)  # type: ignore
             attachment = str(message.attachments[0]) if message.attachments else ''
             messageID = str(message.id)
-            with open(filename, 'a', encoding='utf-8') as f:
-                f.write(f'{messageID},{timestamp},"{content}",{channelID},{authorID},{attachment}\n')
+            # the file name is taken now, so messages from before midnight end up in the file of their day
+            cls.writer.write(  # type: ignore
+                cls.getFileName(), [messageID, timestamp, channelID, authorID, message.content, attachment]
+            )
             return logger.log(
                 logging.INFO,
                 (
@@ -61,6 +69,8 @@ class MessageLogger:
 
     @staticmethod
     def getFileName() -> str:
+        if config['bot']['messageLogger']['backend'] == 'sqlite':
+            return config['bot']['messageLogger']['databaseFile']
         return config['bot']['messageLogger']['exportFile'].replace(
             '{date}', datetime.datetime.now().strftime('%Y-%m-%d')
         )
@@ -1,49 +1,260 @@
+import asyncio
 import logging
-from typing import Optional, List, Union
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Optional, List, Union
 
-from learn.TrustedRNN import TrustedRNN
+from bot.BatchScheduler import BatchScheduler
+from bot.ResponsePool import ResponsePool
+from learn.BannedWordAutomaton import BannedWordAutomaton
+from learn.BatchDecoder import BatchDecoder
+from learn.NumpyPredictor import NumpyPredictor
+from learn.StateCache import StateCache
 from utils.configReader import readConfig
 from utils.colorizer import colorize
 
+if TYPE_CHECKING:
+    # TensorFlow is only imported once a model that needs it is built, the bot starts without it
+    from learn.SavedModelPredictor import SavedModelPredictor
+    from learn.TrustedRNN import TrustedRNN
+
 logger = logging.getLogger('ai.bot.predictiongetter')
 config = readConfig()
 
+# models of the current process when predictions run on a process pool
+workerPredictionGetter: Optional['PredictionGetter'] = None
+
+
+def initializeWorker() -> None:
+    global workerPredictionGetter
+    workerPredictionGetter = PredictionGetter()
+    workerPredictionGetter.initializeModels()
+
+
+def predictInWorker(modelName: str, seed: str, temperature: Union[int, float]) -> str:
+    return workerPredictionGetter.predict(modelName, seed, temperature)  # type: ignore
+
+
+class QueueFullError(Exception):
+    pass
+
 
 class PredictionGetter:
     def __init__(self, activate: bool = False) -> None:
-        self.builtModels = {}
+        self.builtModels: 'OrderedDict[str, Optional[BatchDecoder]]' = OrderedDict()
+        self.modelLock = threading.RLock()
+        self.loadLocks: Dict[str, threading.Lock] = {}
+        self.lazySettings = config['prediction']['lazyLoading']
         self.active = activate
         self.modelSettings = config['prediction']['models']
+        self.poolSettings = config['bot']['predictor']['workerPool']
+        self.useProcesses: bool = self.poolSettings['executor'] == 'process'
+        self.executor: Optional[Executor] = None
+        self.batchSettings = config['prediction']['batching']
+        self.schedulers: Dict[str, BatchScheduler] = {}
+        self.responsePoolSettings = config['prediction']['responsePool']
+        self.responsePools: Dict[str, ResponsePool] = {}
+        self.pending = 0
+        self.pendingLock = threading.Lock()
         if self.active:
             logger.info(f'{colorize("Predictor", "OKBLUE")} is {colorize("active", "GREEN")}')
             logger.info(colorize('Initializing models...', 'OKBLUE'))
-            self.initializeModels()
+            self.startWorkers()
         else:
             logger.info(f'{colorize("Predictor", "OKBLUE")} is {colorize("inactive", "RED")}')
 
     def activate(self) -> None:
         if not self.active:
             self.active = True
-            self.initializeModels()
+            self.startWorkers()
             logger.info(f'{colorize("Predictor", "OKBLUE")} is {colorize("active", "GREEN")}')
 
     def deactivate(self) -> None:
         if self.active:
             self.active = False
-            self.builtModels = {}
+            self.stopWorkers()
+            self.unloadModels()
             logger.info(f'{colorize("Predictor", "OKBLUE")} is {colorize("inactive", "RED")}')
 
+    def startWorkers(self) -> None:
+        """
+        Start the worker pool. Process workers load their own models, thread workers share the models of this process.
+        """
+        workers: int = self.poolSettings['workers']
+        if self.useProcesses:
+            self.executor = ProcessPoolExecutor(workers, initializer=initializeWorker)
+        else:
+            self.initializeModels()
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix='prediction')
+        logger.info(f'Started {workers} prediction {self.poolSettings["executor"]} worker(s)')
+
+    def stopWorkers(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
     def initializeModels(self) -> None:
-        self.builtModels = {}
+        self.unloadModels()
+        if self.lazySettings['useLazyLoading']:
+            logger.info(colorize('Models will be loaded on first use', 'OKBLUE'))
+            return
         for model in self.modelSettings:
-            builtModel = self.buildModel(model)
-            if not builtModel:
-                logger.warning(colorize(f'{model["name"]} failed to build, skipping.', 'WARNING'))
-            self.builtModels[model['name']] = builtModel
+            self.loadModel(model)
         logger.info(colorize('Models initialized', 'OKBLUE'))
 
-    def buildModel(self, model) -> Optional[TrustedRNN]:
+    def loadModel(self, model) -> Optional[BatchDecoder]:
+        """
+        Build a model and start its batch scheduler and response pool, if enabled.
+        """
+        builtModel = self.buildModel(model)
+        if not builtModel:
+            logger.warning(colorize(f'{model["name"]} failed to build, skipping.', 'WARNING'))
+        with self.modelLock:
+            self.builtModels[model['name']] = builtModel
+            if builtModel:
+                self.startModelServices(model, builtModel)
+                self.evictModels()
+        return builtModel
+
+    def getModel(self, modelName: str) -> BatchDecoder:
+        """
+        Get a model, loading it first if it isn't resident. Only one thread loads a given model at a time.
+        """
+        with self.modelLock:
+            if modelName in self.builtModels:
+                self.builtModels.move_to_end(modelName)
+                builtModel = self.builtModels[modelName]
+                if not builtModel:
+                    raise ValueError(f'{modelName} failed to build.')
+                return builtModel
+            loadLock = self.loadLocks.setdefault(modelName, threading.Lock())
+        with loadLock:
+            if modelName in self.builtModels:
+                return self.getModel(modelName)
+            model = next((model for model in self.modelSettings if model['name'] == modelName), None)
+            if not model:
+                raise KeyError(f'Unknown model {modelName}.')
+            logger.info(f'{colorize("Loading model on first use", "OKBLUE")} {modelName}')
+            self.loadModel(model)
+        return self.getModel(modelName)
+
+    def evictModels(self) -> None:
+        """
+        Unload the least recently used models until the resident models fit in the memory budget.
+        Models with requests in their batch scheduler are kept, they are evicted once they are idle.
+        """
+        if not self.lazySettings['useLazyLoading']:
+            return
+        budget = self.lazySettings['memoryBudgetMB'] * 1024 * 1024
+        # the most recently used model is never evicted
+        for modelName in list(self.builtModels)[:-1]:
+            if self.getResidentBytes() <= budget:
+                break
+            if modelName in self.schedulers and not self.schedulers[modelName].isIdle():
+                continue
+            del self.builtModels[modelName]
+            self.stopModelServices(modelName)
+            logger.info(f'{colorize("Evicted model", "OKBLUE")} {modelName}')
+
+    def schedulerIdle(self) -> None:
+        # models that were busy when another model was loaded can be evicted now
+        with self.modelLock:
+            self.evictModels()
+
+    def submitToScheduler(self, modelName: str, seed: str, temperature: Union[int, float]) -> Optional[Future]:
+        """
+        Submit a prediction to the batch scheduler of a model and mark the model as recently used.
+        Returns None if the model has no scheduler, e.g. because it isn't resident.
+        """
+        with self.modelLock:
+            scheduler = self.schedulers.get(modelName)
+            if not scheduler:
+                return None
+            self.builtModels.move_to_end(modelName)
+            logger.debug(f'Scheduling {modelName} with seed {seed} and temperature {temperature}')
+            return scheduler.submit(seed, temperature)
+
+    def getResidentBytes(self) -> int:
+        return sum(model.memoryBytes() for model in self.builtModels.values() if model)
+
+    def isResident(self, modelName: str) -> bool:
+        """
+        Whether a model is loaded in this process, process workers load their own models that aren't tracked here.
+        """
+        return bool(self.builtModels.get(modelName))
+
+    def unloadModels(self) -> None:
+        # stopped schedulers still finish the requests they already have
+        with self.modelLock:
+            for modelName in self.builtModels:
+                self.stopModelServices(modelName)
+            self.builtModels = OrderedDict()
+
+    def startModelServices(self, model, builtModel: BatchDecoder) -> None:
+        """
+        Start the batch scheduler and the response pool of a model, if they are enabled.
+        Concurrent requests to a model with a scheduler are generated together.
+        """
+        if self.batchSettings['useBatching']:
+            self.schedulers[model['name']] = BatchScheduler(
+                builtModel,
+                model['name'],
+                self.batchSettings['maxBatchSize'],
+                self.batchSettings['maxWaitTime'],
+                self.schedulerIdle,
+            )
+        if model.get('responsePool', False):
+            self.responsePools[model['name']] = ResponsePool(
+                builtModel,
+                model['name'],
+                self.responsePoolSettings['temperatures'],
+                self.responsePoolSettings['size'],
+                self.responsePoolSettings['refillInterval'],
+                self.responsePoolSettings['refillBatchSize'],
+                config['prediction']['bannedWords'],
+                lambda: self.pending == 0,
+            )
+
+    def stopModelServices(self, modelName: str) -> None:
+        if modelName in self.schedulers:
+            self.schedulers.pop(modelName).stop()
+        if modelName in self.responsePools:
+            self.responsePools.pop(modelName).stop()
+
+    def takePooledResponse(self, modelName: str, seed: str, temperature: Union[int, float]) -> Optional[str]:
+        """
+        Get a pre-generated message for requests without a seed, None if the request can't be answered from the pool.
+        """
+        if seed != '\n' or modelName not in self.responsePools:
+            return None
+        response = self.responsePools[modelName].take(temperature)
+        if response:
+            logger.debug(f'Answered {modelName} with temperature {temperature} from the response pool')
+        return response
+
+    def buildModel(self, model) -> Optional[BatchDecoder]:
         logger.info(f'{colorize("Building model", "OKGREEN")} {model["name"]}')
+        if model.get('engine', 'tensorflow') in ['numpy', 'int8']:
+            builtModel = self.buildNumpyModel(model)
+        elif model.get('engine', 'tensorflow') == 'savedmodel':
+            builtModel = self.buildSavedModel(model)
+        else:
+            builtModel = self.buildTrustedRNN(model)
+        if builtModel and config['prediction']['stateCache']['useStateCache']:
+            builtModel.stateCache = StateCache(
+                config['prediction']['stateCache']['memoryBudgetMB'] * 1024 * 1024,
+                exactOnly=not builtModel.resumableStates,
+            )
+        if builtModel and config['prediction']['bannedWords']:
+            builtModel.bannedWords = BannedWordAutomaton(
+                config['prediction']['bannedWords'], builtModel.getVocabulary()
+            )
+        return builtModel
+
+    def buildTrustedRNN(self, model) -> Optional['TrustedRNN']:
+        from learn.TrustedRNN import TrustedRNN
+
         vocab = self.loadVocab(model)
         if not vocab:
             logger.warning(colorize(f'{model["name"]} has no vocab, skipping.', 'WARNING'))
@@ -52,6 +263,33 @@ class PredictionGetter:
         rnn.loadFromWeights()
         return rnn
 
+    def buildNumpyModel(self, model) -> Optional[NumpyPredictor]:
+        weightsPath = config['prediction']['int8WeightsPath' if model['engine'] == 'int8' else 'numpyWeightsPath']
+        filename = weightsPath.replace('{runName}', model['name'])
+        try:
+            return NumpyPredictor(filename, **model['options'])
+        except FileNotFoundError:
+            logger.error(
+                f'{colorize("NumPy weights not found", "FAIL")} '
+                f'{filename}. '
+                f'{colorize("Export the model with export.py first", "FAIL")}'
+            )
+            return
+
+    def buildSavedModel(self, model) -> Optional['SavedModelPredictor']:
+        from learn.SavedModelPredictor import SavedModelPredictor
+
+        directory = config['prediction']['savedModelPath'].replace('{runName}', model['name'])
+        try:
+            return SavedModelPredictor(directory, **model['options'])
+        except OSError:
+            logger.error(
+                f'{colorize("SavedModel not found", "FAIL")} '
+                f'{directory}. '
+                f'{colorize("Export the model with export.py first", "FAIL")}'
+            )
+            return
+
     def loadVocab(self, model) -> Optional[List[str]]:
         filename = config['prediction']['vocabPath'].replace('{runName}', model['name'])
         try:
@@ -69,9 +307,53 @@ class PredictionGetter:
 
     def predict(self, modelName: str, seed: str, temperature: Union[int, float]) -> str:
         logger.debug(f'Predicting {modelName} with seed {seed} and temperature {temperature}')
-        prediction = self.builtModels[modelName].predict(seed, temperature)
+        pooledResponse = self.takePooledResponse(modelName, seed, temperature)
+        if pooledResponse:
+            return pooledResponse
+        model = self.getModel(modelName)
+        future = self.submitToScheduler(modelName, seed, temperature)
+        prediction = future.result() if future else model.predict(seed, temperature)
+        return self.cleanPrediction(prediction)
+
+    @staticmethod
+    def cleanPrediction(prediction: str) -> str:
         if prediction.startswith('\n'):
             prediction = prediction[1:]
         if not prediction:
             raise ValueError('Prediction is empty.')
         return prediction
+
+    async def predictAsync(self, modelName: str, seed: str, temperature: Union[int, float]) -> str:
+        """
+        Run a prediction on the worker pool without blocking the event loop.
+        Raises QueueFullError if too many predictions are pending and asyncio.TimeoutError if it takes too long.
+        """
+        if not self.executor:
+            raise ValueError('Prediction workers are not running.')
+        pooledResponse = self.takePooledResponse(modelName, seed, temperature)
+        if pooledResponse:
+            return pooledResponse
+        with self.pendingLock:
+            if self.pending >= self.poolSettings['maxQueueSize']:
+                raise QueueFullError(f'{self.pending} predictions pending.')
+            self.pending += 1
+        try:
+            if self.useProcesses:
+                future = self.executor.submit(predictInWorker, modelName, seed, temperature)
+            else:
+                # the scheduler thread does the work, no need to occupy a pool worker while waiting for it
+                schedulerFuture = self.submitToScheduler(modelName, seed, temperature)
+                # models that aren't resident are loaded by the pool worker, off the event loop
+                future = schedulerFuture or self.executor.submit(self.predict, modelName, seed, temperature)
+        except Exception:
+            # the prediction never started, nothing will count it as done
+            self.predictionDone(None)
+            raise
+        # only count a prediction as done once the worker has finished or dropped it, not when we stop waiting
+        future.add_done_callback(self.predictionDone)
+        prediction = await asyncio.wait_for(asyncio.wrap_future(future), self.poolSettings['timeout'])
+        return self.cleanPrediction(prediction)
+
+    def predictionDone(self, _) -> None:
+        with self.pendingLock:
+            self.pending -= 1
@@ -0,0 +1,74 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Union
+
+from learn.BatchDecoder import BatchDecoder
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.bot.responsepool')
+
+
+class ResponsePool:
+    """
+    Pre-generated messages of a model for requests without a seed, one pool per standard temperature.
+    The pools are refilled in the background while no predictions are pending.
+    """
+    def __init__(
+        self,
+        model: BatchDecoder,
+        name: str,
+        temperatures: List[float],
+        size: int,
+        refillInterval: float,
+        refillBatchSize: int,
+        bannedWords: List[str],
+        isIdle: Callable[[], bool],
+    ) -> None:
+        self.model = model
+        self.name = name
+        self.size = size
+        self.refillInterval = refillInterval
+        self.refillBatchSize = refillBatchSize
+        self.bannedWords = bannedWords
+        self.isIdle = isIdle
+        self.pools: Dict[float, Deque[str]] = {self.key(temperature): deque() for temperature in temperatures}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'responsepool-{name}', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def key(temperature: Union[int, float]) -> float:
+        return round(float(temperature), 3)
+
+    def take(self, temperature: Union[int, float]) -> Optional[str]:
+        """
+        Take a pre-generated message for the temperature, None if there is none.
+        """
+        pool = self.pools.get(self.key(temperature))
+        try:
+            return pool.popleft() if pool else None
+        except IndexError:
+            return None
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def isAcceptable(self, prediction: str) -> bool:
+        return bool(prediction) and all(prediction.find(word) == -1 for word in self.bannedWords)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.refillInterval):
+            if not self.isIdle():
+                continue
+            temperature, pool = min(self.pools.items(), key=lambda item: len(item[1]))
+            missing = self.size - len(pool)
+            if missing <= 0:
+                continue
+            try:
+                predictions = self.model.predictBatch('\n', temperature, min(missing, self.refillBatchSize))
+            except Exception as err:
+                logger.warning(colorize(f'Failed to refill response pool of {self.name}: {err}', 'WARNING'))
+                continue
+            pool.extend(prediction for prediction in predictions if self.isAcceptable(prediction))
+            logger.debug(f'Response pool of {self.name} at temperature {temperature}: {len(pool)}/{self.size}')
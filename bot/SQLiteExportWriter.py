@@ -0,0 +1,55 @@
+import logging
+import sqlite3
+from typing import List, Optional
+
+from bot.ExportWriter import ExportWriter
+
+logger = logging.getLogger('ai.bot.sqliteexportwriter')
+
+
+class SQLiteExportWriter(ExportWriter):
+    """
+    Writes the rows of logged messages to a SQLite database instead of csv files, one transaction per batch.
+    The snowflake ID is the primary key, so the messages are stored in time order,
+    ChannelID and AuthorID are indexed to import only some channels or authors.
+    """
+    def __init__(self, bufferSize: int, flushInterval: float) -> None:
+        # only used by the writer thread
+        self.connection: Optional[sqlite3.Connection] = None
+        super().__init__(bufferSize, flushInterval)
+
+    def connect(self, fileName: str) -> sqlite3.Connection:
+        if self.connection:
+            return self.connection
+        self.connection = sqlite3.connect(fileName)
+        # lets the data processor read the database while the bot writes to it
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS messages ('
+                'ID INTEGER PRIMARY KEY, Timestamp TEXT, ChannelID INTEGER, AuthorID INTEGER, '
+                'Contents TEXT, Attachments TEXT)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS messagesChannelID ON messages (ChannelID)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS messagesAuthorID ON messages (AuthorID)')
+        logger.debug(f'Connected to {fileName}')
+        return self.connection
+
+    def writeRows(self, fileName: str, rows: List[List[str]]) -> None:
+        """
+        Insert rows into the messages table in a single transaction, messages that are already stored are skipped.
+        """
+        connection = self.connect(fileName)
+        with connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (int(messageID), timestamp, int(channelID), int(authorID), contents, attachments or None)
+                    for messageID, timestamp, channelID, authorID, contents, attachments in rows
+                ],
+            )
+
+    def close(self) -> None:
+        if self.connection:
+            self.connection.close()
+            self.connection = None
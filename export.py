@@ -0,0 +1,58 @@
+import sys
+from os import path
+from tempfile import TemporaryDirectory
+
+from bot.PredictionGetter import PredictionGetter
+from learn.NumpyPredictor import NumpyPredictor
+from utils.configReader import readConfig
+from utils.setupLogger import setupLogger
+
+config = readConfig()
+logger = setupLogger('ai', level='DEBUG')
+
+formats = ['numpy', 'int8', 'savedmodel']
+
+if len(sys.argv) < 3 or sys.argv[2] not in formats:
+    print('Usage: python export.py [model] [format] [heldOutFile]')
+    print(f'Available formats: {formats}')
+    sys.exit(1)
+
+name = str(sys.argv[1])
+exportFormat = str(sys.argv[2])
+if name not in [model['name'] for model in config['prediction']['models']]:
+    print('Invalid model')
+    print(f'Available models: {[model["name"] for model in config["prediction"]["models"]]}')
+    sys.exit(1)
+
+for model in config['prediction']['models']:
+    if model['name'] == name:
+        modelDict = model
+
+rnn = PredictionGetter().buildTrustedRNN(modelDict)
+if not rnn:
+    sys.exit(1)
+
+if exportFormat == 'numpy':
+    rnn.exportNumpyWeights(config['prediction']['numpyWeightsPath'].replace('{runName}', name))
+
+if exportFormat == 'savedmodel':
+    rnn.exportSavedModel(config['prediction']['savedModelPath'].replace('{runName}', name))
+
+if exportFormat == 'int8':
+    fileName = config['prediction']['int8WeightsPath'].replace('{runName}', name)
+    rnn.exportNumpyWeights(fileName, quantize=True)
+    if len(sys.argv) > 3:
+        # compare the quantized model with the float one on held out text
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            text = f.read()
+        with TemporaryDirectory() as directory:
+            floatFileName = path.join(directory, 'float.npz')
+            rnn.exportNumpyWeights(floatFileName)
+            floatModel = NumpyPredictor(floatFileName)
+        quantizedModel = NumpyPredictor(fileName)
+        floatEntropy = floatModel.crossEntropy(text)
+        quantizedEntropy = quantizedModel.crossEntropy(text)
+        print(f'Cross-entropy on {len(text)} characters, nats per character')
+        print(f'float32 {floatEntropy:.4f}, {floatModel.memoryBytes() / 1024 / 1024:.1f} MB')
+        print(f'int8    {quantizedEntropy:.4f}, {quantizedModel.memoryBytes() / 1024 / 1024:.1f} MB')
+        print(f'Difference {quantizedEntropy - floatEntropy:+.4f}')
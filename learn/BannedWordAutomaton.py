@@ -0,0 +1,85 @@
+from collections import deque
+from typing import Deque, Dict, List
+
+import numpy as np
+
+
+class BannedWordAutomaton:
+    """
+    Aho-Corasick automaton over the banned words, used to keep generated messages from containing them.
+    The state after some text is the longest suffix of it that starts a banned word. For every state, masks holds
+    -inf for the characters that would complete a banned word and 0 for all others, added to the logits before
+    sampling like the [UNK] mask.
+    A newline starts a new message (see GeneratedMessage), so it always leads back to the root.
+    """
+    def __init__(self, words: List[str], vocabulary: List[str]) -> None:
+        self.charToID = {char: i for i, char in enumerate(vocabulary)}
+        # words containing characters that can't be generated can't be completed either
+        self.words = sorted(
+            word for word in set(words) if word and '\n' not in word and all(char in self.charToID for char in word)
+        )
+
+        # trie of the words
+        children: List[Dict[int, int]] = [{}]
+        terminal = [False]
+        for word in self.words:
+            state = 0
+            for char in word:
+                charID = self.charToID[char]
+                if charID not in children[state]:
+                    children[state][charID] = len(children)
+                    children.append({})
+                    terminal.append(False)
+                state = children[state][charID]
+            terminal[state] = True
+
+        # complete the transitions with the failure links, breadth first so the shorter suffixes are done first
+        self.transitions = np.zeros((len(children), len(vocabulary)), dtype=np.int32)
+        fail = np.zeros(len(children), dtype=np.int32)
+        queue: Deque[int] = deque()
+        for charID, child in children[0].items():
+            self.transitions[0, charID] = child
+            queue.append(child)
+        while queue:
+            state = queue.popleft()
+            terminal[state] = terminal[state] or terminal[fail[state]]
+            self.transitions[state] = self.transitions[fail[state]]
+            for charID, child in children[state].items():
+                fail[child] = self.transitions[fail[state], charID]
+                self.transitions[state, charID] = child
+                queue.append(child)
+        if '\n' in self.charToID:
+            self.transitions[:, self.charToID['\n']] = 0
+
+        self.masks = np.where(np.array(terminal)[self.transitions], -np.inf, 0.0).astype(np.float32)
+        # a state where every character completes a word can't be avoided, leave it to the check of the message
+        generatable = np.array([char != '[UNK]' for char in vocabulary])
+        self.masks[np.isinf(self.masks[:, generatable]).all(axis=1)] = 0.0
+
+    def __len__(self) -> int:
+        return len(self.transitions)
+
+    def start(self, text: str) -> int:
+        """
+        The state after a text, e.g. a seed.
+        """
+        state = 0
+        for char in text:
+            charID = self.charToID.get(char)
+            state = 0 if charID is None else int(self.transitions[state, charID])
+        return state
+
+    def startStates(self, texts: List[str]) -> np.ndarray:
+        return np.array([self.start(text) for text in texts], dtype=np.int32)
+
+    def step(self, states: np.ndarray, chars: List[str]) -> np.ndarray:
+        """
+        Advance the states of a batch of rows by one generated character each.
+        """
+        return self.transitions[states, [self.charToID[char] for char in chars]]
+
+    def getMasks(self, states: np.ndarray) -> np.ndarray:
+        """
+        The logit masks of a batch of rows, shape (batch, vocabulary size).
+        """
+        return self.masks[states]
@@ -0,0 +1,218 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from learn.BannedWordAutomaton import BannedWordAutomaton
+from learn.GeneratedMessage import GeneratedMessage
+from learn.StateCache import StateCache
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.learn.batchdecoder')
+
+
+class BatchDecoder:
+    """
+    Base class for prediction engines. Generates batches of messages character by character,
+    the engines only provide the model specific steps.
+    """
+    maxPredictionLength: int = 500
+    defaultTemperature: float = 1.0
+    stateCache: Optional[StateCache] = None
+    # characters that would complete a banned word are never sampled
+    bannedWords: Optional[BannedWordAutomaton] = None
+    # whether feeding a seed in two parts gives the same state as feeding it at once
+    resumableStates: bool = True
+    # the unidirectional models that carry all their context in their states, GRU_2layer starts its second layer
+    # from the final state of the first one and the backward layer of BiLSTM_multilayer reads the whole input
+    resumableModelTypes = ['GRU_1layer', 'LSTM_1layer', 'LSTM_multilayer']
+
+    def predict(self, seed: str, temperature: Optional[float] = None) -> str:
+        """
+        Predict text based on seed using temperature.
+
+        :param str seed: The seed to use for prediction.
+        :param float temperature: The temperature to use for prediction.
+        """
+        return self.predictBatch([seed], [temperature])[0]
+
+    def predictBatch(
+        self,
+        seeds: Union[str, List[str]],
+        temperatures: Union[None, float, List[Optional[float]]] = None,
+        n: int = 1,
+    ) -> List[str]:
+        """
+        Predict n texts for every seed, running all of them as a single batch.
+
+        :param seeds: The seed or list of seeds to use for prediction.
+        :param temperatures: The temperature for all seeds or a list with one temperature per seed.
+        :param int n: The number of predictions per seed.
+        :return: The predictions, n consecutive entries per seed.
+        """
+        rows = self.makeRows(seeds, temperatures, n)
+        self.decode(rows)
+        results = [row.getText() for row in rows]
+        for result in results:
+            logger.debug(f'{colorize("Prediction:", "OKGREEN")} {colorize(result, "OKCYAN")}')
+        return results
+
+    def makeRows(
+        self,
+        seeds: Union[str, List[str]],
+        temperatures: Union[None, float, List[Optional[float]]] = None,
+        n: int = 1,
+    ) -> List[GeneratedMessage]:
+        """
+        Make the rows for the given seeds and temperatures, n rows per seed.
+        """
+        if isinstance(seeds, str):
+            seeds = [seeds]
+        if not isinstance(temperatures, list):
+            temperatures = [temperatures] * len(seeds)
+        return [
+            GeneratedMessage(seed.lower(), temperature or self.defaultTemperature, self.maxPredictionLength)
+            for seed, temperature in zip(seeds, temperatures)
+            for _ in range(n)
+        ]
+
+    def decode(self, rows: List[GeneratedMessage]) -> None:
+        """
+        Generate the given rows. Engines with a faster way of generating whole batches override this.
+
+        :param rows: The rows to generate.
+        """
+        self.decodeRows(rows)
+
+    def decodeRows(self, rows: List[GeneratedMessage]) -> None:
+        """
+        Generate the given rows character by character, removing finished rows from the batch.
+
+        :param rows: The rows to generate.
+        """
+        automatonStates = self.bannedWords.startStates([row.seed for row in rows]) if self.bannedWords else None
+        nextChars, states = self.startRows(rows, automatonStates)
+        active = list(range(len(rows)))
+
+        while True:
+            keep = [i for i, (rowIndex, char) in enumerate(zip(active, nextChars)) if not rows[rowIndex].append(char)]
+            if not keep:
+                break
+            if self.bannedWords:
+                automatonStates = self.bannedWords.step(automatonStates, nextChars)
+            if len(keep) < len(active):
+                active = [active[i] for i in keep]
+                nextChars = [nextChars[i] for i in keep]
+                states = self.selectStates(states, keep)
+                if self.bannedWords:
+                    automatonStates = automatonStates[keep]
+            nextChars, states = self.stepRows(
+                nextChars, states, [rows[i].temperature for i in active], self.getMasks(automatonStates)
+            )
+
+    def getMasks(self, automatonStates: Any) -> Any:
+        """
+        The banned word masks for the logits of the rows, None without banned words or automaton states.
+        """
+        if not self.bannedWords or automatonStates is None:
+            return None
+        return self.bannedWords.getMasks(automatonStates)
+
+    def startRows(self, rows: List[GeneratedMessage], automatonStates: Any = None) -> Tuple[List[str], Any]:
+        """
+        Feed the seeds of the given rows and predict their first characters.
+        Every distinct seed is only fed once, its state is repeated for all rows using it.
+
+        :param rows: The rows to start.
+        :param automatonStates: The banned word automaton states of the rows.
+        :return: The predicted characters and the states, in the order of the rows.
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, row in enumerate(rows):
+            groups.setdefault(row.seed, []).append(i)
+        order, logits, states = [], [], []
+        for seed, indices in groups.items():
+            seedLogits, state = self.feedSeedCached(seed)
+            order.extend(indices)
+            logits.append(self.selectStates(seedLogits, [0] * len(indices)))
+            states.append(self.selectStates(state, [0] * len(indices)))
+        # restore the order of the rows
+        inverse = sorted(range(len(order)), key=order.__getitem__)
+        logits = self.selectStates(self.concatStates(logits), inverse)
+        return (
+            self.sampleRows(logits, [row.temperature for row in rows], self.getMasks(automatonStates)),
+            self.selectStates(self.concatStates(states), inverse),
+        )
+
+    def feedSeedCached(self, seed: str) -> Tuple[Any, Any]:
+        """
+        Feed a seed, starting from the longest prefix in the state cache if there is one.
+
+        :param str seed: The seed.
+        :return: The logits after the seed and the states, both with a batch size of one.
+        """
+        if not self.stateCache:
+            return self.feedSeed(seed, None)
+        prefixLength, logits, states = self.stateCache.lookup(seed)
+        if prefixLength < len(seed):
+            logits, states = self.feedSeed(seed[prefixLength:], states)
+            self.stateCache.store(seed, logits, states)
+        stats = self.stateCache.getStats()
+        logger.debug(
+            f'State cache: fed {len(seed) - prefixLength} of {len(seed)} seed characters, '
+            f'{stats["hits"]} hits, {stats["partialHits"]} partial hits, {stats["misses"]} misses, '
+            f'{stats["entries"]} entries, {stats["bytes"] / 1024 / 1024:.1f} MB'
+        )
+        return logits, states
+
+    def feedSeed(self, seed: str, states: Any) -> Tuple[Any, Any]:
+        """
+        Feed a single seed.
+
+        :param str seed: The seed.
+        :param states: The states to start from, None for the initial states.
+        :return: The logits after the seed and the states, both with a batch size of one.
+        """
+        raise NotImplementedError
+
+    def sampleRows(self, logits: Any, temperatures: List[float], masks: Any = None) -> List[str]:
+        """
+        Sample one character per row from the logits, masks are added to the logits if given.
+        """
+        raise NotImplementedError
+
+    def stepRows(
+        self, chars: List[str], states: Any, temperatures: List[float], masks: Any = None
+    ) -> Tuple[List[str], Any]:
+        """
+        Feed one character per row and predict the next ones.
+
+        :param chars: The last character of every row.
+        :param states: The states of the rows.
+        :param temperatures: The temperature of every row.
+        :param masks: Added to the logits of every row before sampling, if given.
+        :return: The predicted characters and the new states.
+        """
+        raise NotImplementedError
+
+    def selectStates(self, states: Any, indices: List[int]) -> Any:
+        """
+        Select the states of the given rows.
+        """
+        raise NotImplementedError
+
+    def getVocabulary(self) -> List[str]:
+        """
+        The characters of the model in the order of their IDs, starting with [UNK].
+        """
+        raise NotImplementedError
+
+    def memoryBytes(self) -> int:
+        """
+        Approximate memory used by the weights of the model in bytes.
+        """
+        return 0
+
+    def concatStates(self, states: List[Any]) -> Any:
+        """
+        Concatenate the states of several batches.
+        """
+        raise NotImplementedError
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+from os import path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.learn.corpuscache')
+
+
+class CorpusCache:
+    """
+    Cache of processed corpora, stored as arrays of character IDs next to their vocabulary.
+    Entries are addressed by a hash of the input files and the data settings, so changing either makes a new entry.
+    Doesn't depend on pandas, a cache hit skips the data processor entirely.
+    """
+    def __init__(self, cachePath: str) -> None:
+        self.cachePath = cachePath
+
+    @staticmethod
+    def getFileParts(fileName: str) -> List[str]:
+        """
+        The files holding the contents of an input file. Recent writes to an SQLite database in WAL mode are only
+        in its -wal file until they are checkpointed.
+        """
+        return [fileName] + [part for part in [f'{fileName}-wal'] if path.exists(part)]
+
+    @staticmethod
+    def computeKey(fileNames: List[str], settings: Dict[str, Any]) -> str:
+        """
+        Hash the contents of the input files and the data settings.
+
+        :param fileNames: The input files.
+        :param settings: The data settings the corpus is processed with.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        for fileName in fileNames:
+            for part in CorpusCache.getFileParts(fileName):
+                digest.update(part.encode('utf-8') + b'\0')
+                with open(part, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+                digest.update(b'\0')
+        return digest.hexdigest()
+
+    @staticmethod
+    def encode(text: str, vocab: List[str]) -> np.ndarray:
+        """
+        Encode text as the IDs of its characters, the index in the vocabulary plus one.
+        ID 0 is reserved for unknown characters, the same as the StringLookup layer of the model.
+        Uses the smallest unsigned integer type that fits the vocabulary.
+
+        :param str text: The text.
+        :param vocab: The vocabulary, containing every character of the text.
+        """
+        dtype = np.uint8 if len(vocab) < 2 ** 8 else np.uint16 if len(vocab) < 2 ** 16 else np.uint32
+        codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        vocabCodepoints = np.array([ord(char) for char in vocab], dtype=np.uint32)
+        order = np.argsort(vocabCodepoints)
+        positions = np.searchsorted(vocabCodepoints[order], codepoints)
+        positions = np.minimum(positions, len(vocab) - 1)
+        ids = order[positions] + 1
+        ids[vocabCodepoints[order[positions]] != codepoints] = 0
+        return ids.astype(dtype)
+
+    def getPaths(self, key: str) -> Tuple[str, str]:
+        """
+        Get the files of the IDs and the vocabulary of a corpus.
+        """
+        return path.join(self.cachePath, f'{key}.ids.npy'), path.join(self.cachePath, f'{key}.vocab.npy')
+
+    def load(self, key: str) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """
+        Load a cached corpus, the IDs are memory mapped.
+
+        :param str key: The key of the corpus.
+        :return: The IDs and the vocabulary, None if the corpus isn't cached.
+        """
+        idsPath, vocabPath = self.getPaths(key)
+        if not path.exists(idsPath) or not path.exists(vocabPath):
+            return None
+        ids = np.load(idsPath, mmap_mode='r')
+        vocab = [chr(codepoint) for codepoint in np.load(vocabPath)]
+        logger.info(f'{colorize("Loaded cached corpus", "OKGREEN")} {key[:12]}, {len(ids)} characters')
+        return ids, vocab
+
+    def store(self, key: str, text: str, vocab: List[str]) -> np.ndarray:
+        """
+        Encode a corpus and store it in the cache.
+
+        :param str key: The key of the corpus.
+        :param str text: The processed text.
+        :param vocab: The vocabulary of the text.
+        :return: The IDs.
+        """
+        ids = self.encode(text, vocab)
+        os.makedirs(self.cachePath, exist_ok=True)
+        idsPath, vocabPath = self.getPaths(key)
+        np.save(vocabPath, np.array([ord(char) for char in vocab], dtype=np.uint32))
+        # write the IDs last and under a temporary name, so an interrupted store never looks like a cached corpus
+        temporaryPath = f'{idsPath}.{os.getpid()}.tmp'
+        with open(temporaryPath, 'wb') as f:
+            np.save(f, ids)
+        os.replace(temporaryPath, idsPath)
+        logger.info(f'{colorize("Cached corpus", "OKGREEN")} {key[:12]}, {len(ids)} characters')
+        return ids
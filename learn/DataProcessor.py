@@ -1,17 +1,42 @@
-import glob
+import datetime
 import logging
-from typing import Tuple, List, Optional
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from typing import Any, Tuple, List, Optional
 
 import regex as re
 import pandas as pd
 
+from learn.FilterPlan import FilterPlan
 from utils.configReader import readConfig
+from utils.inputFiles import getInputFiles
+from utils.snowflakeConverter import toSnowflake
 from utils.colorizer import colorize
 
 config = readConfig()
 logger = logging.getLogger('ai.learn.dataprocessor')
 
 
+def processFile(fileName: str) -> Tuple[pd.DataFrame, float]:
+    """
+    Import, filter and drop the empty rows of a single file. Runs in the worker processes of importAndFilterData.
+
+    :param str fileName: Filename.
+    :return: The timestamps and contents of the remaining rows and the time it took in seconds.
+    """
+    start = time.perf_counter()
+    dp = DataProcessor()
+    dp.importData(fileName)
+    dp.dropAttachments()
+    dp.dataframe = dp.dataframe[[column for column in ('Timestamp', 'Contents') if column in dp.dataframe.columns]]
+    dp.filterContent()
+    dp.dropEmptyContent()
+    return dp.dataframe, time.perf_counter() - start
+
+
 class DataProcessor:
     """
     Class to import and process training data.
@@ -20,17 +45,15 @@ class DataProcessor:
         self.dataframe = pd.DataFrame()
         self.text: Optional[str] = None
         self.vocab = []
+        self.filterPlan: Optional[FilterPlan] = None
 
     def processInputData(self) -> Tuple[str, List[str]]:
         """
         Import and process data, returns text and vocabulary.
         """
-        self.importData()
+        self.importAndFilterData()
         self.sortByTimestamp()
         self.dropColumns()
-        self.dropAttachments()
-        self.filterContent()
-        self.dropEmptyContent()
         self.resetIndex()
         self.dfToText()
         self.generateVocab()
@@ -98,7 +121,8 @@ class DataProcessor:
                     'FAIL',
                 )
             )
-        self.dataframe.sort_values('Timestamp', inplace=True)  # type: ignore
+        # stable, so messages with the same timestamp stay in file order
+        self.dataframe.sort_values('Timestamp', kind='stable', inplace=True)  # type: ignore
         self.dataframe.drop('Timestamp', axis=1, inplace=True)
         logger.debug('Sorted by timestamp')
 
@@ -107,18 +131,95 @@ class DataProcessor:
         Import data from specified file or from globs specified in config (default).
         """
         listOfDFs = []
-        if fileName:
+        if fileName and fileName == config['learn']['data']['inputDatabase']:
+            listOfDFs.append(self.importDatabase(fileName))
+        elif fileName:
             listOfDFs.append(pd.read_csv(fileName))
         else:
-            for fileGlob in config['learn']['data']['inputFiles']:
-                for fileName in glob.glob(f'data\\{fileGlob}'):
-                    logger.debug(f'Importing {fileName}')
-                    listOfDFs.append(pd.read_csv(fileName))
+            for fileName in getInputFiles():
+                logger.debug(f'Importing {fileName}')
+                listOfDFs.append(pd.read_csv(fileName))
         self.dataframe = pd.concat(listOfDFs)
         if 'Contents' not in self.dataframe.columns:
             raise Exception('Contents column not found in dataframe.')
         logger.debug('Data imported.')
 
+    @staticmethod
+    def importDatabase(fileName: str) -> pd.DataFrame:
+        """
+        Import the messages of a message logger database in time order.
+        The database filter of the config and dropping rows with attachments are done by the query.
+
+        :param str fileName: Filename of the database.
+        """
+        databaseFilter = config['learn']['data']['databaseFilter']
+        conditions = ["Contents IS NOT NULL", "Contents != ''"]
+        parameters: List[Any] = []
+        if config['learn']['data']['removeRowIfAttachment']:
+            conditions.append('Attachments IS NULL')
+        for column, key in (('ChannelID', 'channelIDs'), ('AuthorID', 'authorIDs')):
+            if databaseFilter[key]:
+                conditions.append(f'{column} IN ({", ".join("?" * len(databaseFilter[key]))})')
+                parameters += [int(ID) for ID in databaseFilter[key]]
+        if databaseFilter['after']:
+            conditions.append('ID >= ?')
+            parameters.append(toSnowflake(datetime.datetime.fromisoformat(databaseFilter['after'])))
+        if databaseFilter['before']:
+            conditions.append('ID < ?')
+            parameters.append(toSnowflake(datetime.datetime.fromisoformat(databaseFilter['before'])))
+        query = f'SELECT * FROM messages WHERE {" AND ".join(conditions)} ORDER BY ID'
+        logger.debug(f'Importing {fileName} with {query}')
+        with closing(sqlite3.connect(f'file:{fileName}?mode=ro', uri=True)) as connection:
+            return pd.read_sql_query(query, connection, params=parameters)
+
+    def importAndFilterData(self) -> None:
+        """
+        Import, filter and drop the empty rows of every input file.
+        The results are concatenated in file order and still need to be sorted by timestamp.
+        """
+        fileNames = getInputFiles()
+        if not fileNames:
+            raise Exception('No input files found.')
+        self.dataframe = pd.concat(self.processFiles(fileNames))
+
+    @staticmethod
+    def processFiles(fileNames: List[str]) -> List[pd.DataFrame]:
+        """
+        Import, filter and drop the empty rows of the given files, one file per task on a process pool.
+
+        :param fileNames: The files to process.
+        :return: The timestamps and contents of every file.
+        """
+        workers = min(config['learn']['data']['workers'] or os.cpu_count() or 1, len(fileNames))
+        start = time.perf_counter()
+        if workers > 1:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(processFile, fileNames))
+        else:
+            results = [processFile(fileName) for fileName in fileNames]
+        for fileName, (dataframe, seconds) in zip(fileNames, results):
+            logger.debug(f'Processed {fileName} in {seconds:.2f}s, {len(dataframe)} messages')
+        logger.info(
+            f'{colorize("Processed " + str(len(fileNames)) + " files", "OKGREEN")} '
+            f'in {time.perf_counter() - start:.2f}s with {workers} worker(s)'
+        )
+        return [dataframe for dataframe, _ in results]
+
+    def processFilesToText(self, fileNames: List[str]) -> List[str]:
+        """
+        Process the given files and convert each of them to text, with its messages sorted by timestamp.
+
+        :param fileNames: The files to process.
+        :return: The text of every file.
+        """
+        texts = []
+        for dataframe in self.processFiles(fileNames):
+            self.dataframe = dataframe
+            self.sortByTimestamp()
+            self.dfToText()
+            texts.append(self.text)
+        return texts  # type: ignore
+
     def dropColumns(self) -> None:
         """
         Drop all unnecessary columns.
@@ -147,6 +248,7 @@ class DataProcessor:
     def filterString(string: str) -> str:
         """
         Filter the string based on settings specified in config.
+        Reference implementation for a single string, filterContent uses the equivalent FilterPlan.
 
         :param str string: String to filter.
         """
@@ -200,7 +302,9 @@ class DataProcessor:
         """
         Apply the filter to the entire dataframe.
         """
-        self.dataframe['Contents'] = self.dataframe['Contents'].apply(self.filterString)
+        if not self.filterPlan:
+            self.filterPlan = FilterPlan(config['learn']['data'])
+        self.dataframe['Contents'] = self.filterPlan.apply(self.dataframe['Contents'])
         logger.debug('Content filtered.')
 
     def dropEmptyContent(self) -> None:
@@ -0,0 +1,55 @@
+from typing import List
+
+
+class GeneratedMessage:
+    """
+    Keeps track of a single message while it is generated and decides when it is finished.
+    """
+    def __init__(self, seed: str, temperature: float, maxLength: int) -> None:
+        self.seed = seed
+        self.temperature = temperature
+        self.maxLength = maxLength
+        self.result: List[str] = []
+        self.steps = 0
+        self.finished = False
+        self.hasContent = bool(seed.strip())
+
+    def append(self, char: str) -> bool:
+        """
+        Append a generated character, returns whether the message is finished.
+
+        :param str char: The generated character.
+        """
+        self.steps += 1
+        self.result.append(char)
+        if not char.isspace():
+            self.hasContent = True
+        if char == '\n':
+            if len(self.result) > 3 and self.hasContent:
+                self.finished = True
+                return True
+            self.seed = ''
+            self.result = []
+            self.hasContent = False
+        # maximum discord message length is 2000
+        if len(self.seed) + len(self.result) >= 1999 or self.steps >= self.maxLength:
+            self.finished = True
+        return self.finished
+
+    def setResult(self, text: str, keepSeed: bool) -> None:
+        """
+        Set the result of a message that was generated elsewhere, e.g. in a compiled decode loop.
+
+        :param str text: The generated text.
+        :param bool keepSeed: Whether the seed is part of the message.
+        """
+        if not keepSeed:
+            self.seed = ''
+        self.result = [text]
+        self.finished = True
+
+    def getText(self) -> str:
+        """
+        Get the generated message including the seed, if it was kept.
+        """
+        return (self.seed + ''.join(self.result)).strip()
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+from os import path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from learn.CorpusCache import CorpusCache
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.learn.incrementalcorpus')
+
+
+class IncrementalCorpus:
+    """
+    Processed corpus that is updated as input files are added or changed, instead of being processed from scratch.
+    A manifest records the size and modification time of every processed file, the processed text of every file is
+    kept as a segment. New files are appended to the stored character IDs, the corpus is only re-encoded when
+    new characters appear or older files changed.
+    """
+    def __init__(self, corpusPath: str) -> None:
+        self.corpusPath = corpusPath
+        self.manifestPath = path.join(corpusPath, 'manifest.json')
+        self.idsPath = path.join(corpusPath, 'ids.bin')
+        self.segmentsPath = path.join(corpusPath, 'segments')
+        self.manifest = self.loadManifest()
+
+    @staticmethod
+    def emptyManifest(settingsKey: str = '') -> Dict[str, Any]:
+        return {'settings': settingsKey, 'vocab': '', 'dtype': 'uint8', 'length': 0, 'files': {}}
+
+    def loadManifest(self) -> Dict[str, Any]:
+        if not path.exists(self.manifestPath):
+            return self.emptyManifest()
+        with open(self.manifestPath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def saveManifest(self) -> None:
+        temporaryPath = f'{self.manifestPath}.{os.getpid()}.tmp'
+        with open(temporaryPath, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(temporaryPath, self.manifestPath)
+
+    @staticmethod
+    def getFileState(fileName: str) -> Dict[str, int]:
+        stats = [os.stat(part) for part in CorpusCache.getFileParts(fileName)]
+        # a database also changes when only its -wal file does
+        return {
+            'size': stats[0].st_size,
+            'mtime': stats[0].st_mtime_ns,
+            **({'walSize': stats[1].st_size, 'walMtime': stats[1].st_mtime_ns} if len(stats) > 1 else {}),
+        }
+
+    def getSegmentPath(self, fileName: str) -> str:
+        return path.join(self.segmentsPath, f'{hashlib.sha256(fileName.encode("utf-8")).hexdigest()[:16]}.txt')
+
+    def readSegment(self, fileName: str) -> str:
+        with open(self.getSegmentPath(fileName), 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def writeSegment(self, fileName: str, text: str) -> None:
+        with open(self.getSegmentPath(fileName), 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+
+    def isConsistent(self) -> bool:
+        """
+        Whether the stored IDs match the manifest, they don't if an update was interrupted.
+        """
+        expectedBytes = self.manifest['length'] * np.dtype(self.manifest['dtype']).itemsize
+        return path.exists(self.idsPath) and path.getsize(self.idsPath) == expectedBytes
+
+    def update(self, fileNames: List[str], settings: Dict[str, Any]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Process the new and changed input files and update the corpus.
+
+        :param fileNames: All input files, in the order of the corpus.
+        :param settings: The data settings, all files are processed again when they change.
+        :return: The character IDs, memory mapped, and the vocabulary.
+        """
+        os.makedirs(self.segmentsPath, exist_ok=True)
+        settingsKey = CorpusCache.computeKey([], settings)
+        if self.manifest['settings'] != settingsKey:
+            if self.manifest['files']:
+                logger.info(colorize('Data settings changed, processing all files again', 'OKBLUE'))
+            self.manifest = self.emptyManifest(settingsKey)
+        files: Dict[str, Dict[str, Any]] = self.manifest['files']
+        previousFiles = list(files)
+        changed = [fileName for fileName in fileNames if files.get(fileName) != self.getFileState(fileName)]
+        removed = [fileName for fileName in previousFiles if fileName not in fileNames]
+        if not changed and not removed and self.isConsistent():
+            logger.info(f'{colorize("Corpus is up to date", "OKGREEN")}, {len(fileNames)} files')
+            return self.load()
+
+        texts: List[str] = []
+        if changed:
+            # pandas is only imported when there is something to process
+            from learn.DataProcessor import DataProcessor
+
+            texts = DataProcessor().processFilesToText(changed)
+            for fileName, text in zip(changed, texts):
+                self.writeSegment(fileName, text)
+                files[fileName] = self.getFileState(fileName)
+        for fileName in removed:
+            if path.exists(self.getSegmentPath(fileName)):
+                os.remove(self.getSegmentPath(fileName))
+            del files[fileName]
+
+        newText = '\n'.join(text for text in texts if text)
+        vocab = list(self.manifest['vocab'])
+        # appending is enough if the new files come after all processed ones and don't add characters
+        canAppend = (
+            not removed
+            and not any(fileName in previousFiles for fileName in changed)
+            and fileNames[:len(previousFiles)] == previousFiles
+            and set(newText) <= set(vocab)
+            and self.isConsistent()
+        )
+        if canAppend:
+            self.append(newText, vocab)
+        else:
+            self.rebuild(fileNames)
+        self.manifest['files'] = {fileName: files[fileName] for fileName in fileNames}
+        self.saveManifest()
+        return self.load()
+
+    def append(self, text: str, vocab: List[str]) -> None:
+        """
+        Append the text of new files to the stored IDs.
+        """
+        if self.manifest['length'] and text:
+            text = '\n' + text
+        ids = CorpusCache.encode(text, vocab)
+        with open(self.idsPath, 'ab') as f:
+            ids.tofile(f)
+        self.manifest['length'] += len(ids)
+        logger.info(f'{colorize("Appended", "OKGREEN")} {len(ids)} characters to the corpus')
+
+    def rebuild(self, fileNames: List[str]) -> None:
+        """
+        Encode the corpus again from the segments of all files, with a new vocabulary.
+        """
+        text = '\n'.join(segment for segment in (self.readSegment(fileName) for fileName in fileNames) if segment)
+        vocab = sorted(set(text))
+        ids = CorpusCache.encode(text, vocab)
+        temporaryPath = f'{self.idsPath}.{os.getpid()}.tmp'
+        with open(temporaryPath, 'wb') as f:
+            ids.tofile(f)
+        os.replace(temporaryPath, self.idsPath)
+        self.manifest.update(vocab=''.join(vocab), dtype=ids.dtype.name, length=len(ids))
+        logger.info(f'{colorize("Re-encoded the corpus", "OKGREEN")}, {len(ids)} characters, {len(vocab)} in vocab')
+
+    def load(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Load the character IDs, memory mapped, and the vocabulary.
+        """
+        dtype = np.dtype(self.manifest['dtype'])
+        if not self.manifest['length']:
+            return np.zeros(0, dtype=dtype), []
+        return np.memmap(self.idsPath, dtype=dtype, mode='r'), list(self.manifest['vocab'])
@@ -0,0 +1,59 @@
+import logging
+from statistics import median
+from typing import Any, MutableMapping
+
+import tensorflow as tf
+
+from utils.colorizer import colorize
+
+logger = logging.getLogger('ai.learn.medianpruningcallback')
+
+
+class MedianPruningCallback(tf.keras.callbacks.Callback):
+    """
+    Stops a sweep trial when its monitored value at the end of an epoch is worse than the median of the other
+    trials at the same epoch. The values of all trials are shared through a store, keyed by trial and epoch.
+    """
+    def __init__(
+        self,
+        trial: int,
+        store: MutableMapping[str, float],
+        monitor: str,
+        startEpoch: int,
+        minTrials: int,
+    ) -> None:
+        super().__init__()
+        self.trial = trial
+        self.store = store
+        self.monitor = monitor
+        self.startEpoch = startEpoch
+        self.minTrials = minTrials
+        # the same mode EarlyStopping picks automatically
+        self.higherIsBetter = 'acc' in monitor or monitor.startswith('fmeasure')
+        self.pruned = False
+
+    def isWorse(self, value: float, reference: float) -> bool:
+        return value < reference if self.higherIsBetter else value > reference
+
+    def on_epoch_end(self, epoch: int, logs: Any = None) -> None:
+        value = (logs or {}).get(self.monitor)
+        if value is None:
+            return
+        self.store[f'{self.trial}:{epoch}'] = float(value)
+        if epoch + 1 < self.startEpoch:
+            return
+        others = [
+            otherValue
+            for key, otherValue in self.store.items()
+            if key.endswith(f':{epoch}') and key != f'{self.trial}:{epoch}'
+        ]
+        if len(others) < self.minTrials:
+            return
+        reference = median(others)
+        if self.isWorse(value, reference):
+            logger.info(
+                f'{colorize("Pruned trial", "WARNING")} {self.trial} after epoch {epoch + 1}, '
+                f'{self.monitor} {value:.4f} is worse than the median {reference:.4f}'
+            )
+            self.pruned = True
+            self.model.stop_training = True
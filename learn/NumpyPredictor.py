@@ -0,0 +1,296 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from learn.BatchDecoder import BatchDecoder
+from learn.QuantizedMatrix import QuantizedMatrix
+from utils.configReader import readConfig
+from utils.colorizer import colorize
+from utils.nestedStates import mapStates
+
+config = readConfig()
+logger = logging.getLogger('ai.learn.numpypredictor')
+
+
+def sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+class NumpyPredictor(BatchDecoder):
+    """
+    Prediction engine that steps the exported weights of a model with NumPy only, without TensorFlow.
+    The weights can be quantized to int8 to save memory, see QuantizedMatrix.
+    """
+    supportedModelTypes = ['GRU_1layer', 'GRU_2layer', 'LSTM_1layer', 'LSTM_multilayer']
+
+    def __init__(self, fileName: str, temperature: float = 1.0, **kwargs) -> None:
+        self.maxPredictionLength = config['prediction']['maxPredictionLength']
+        self.defaultTemperature = temperature
+        for option in kwargs.keys():
+            if hasattr(self, option) and isinstance(getattr(self, option), type(kwargs[option])):
+                setattr(self, option, kwargs[option])
+
+        with np.load(fileName) as weights:
+            self.modelType = str(weights['modelType'])
+            if self.modelType not in self.supportedModelTypes:
+                raise ValueError(f'{self.modelType} is not supported by the NumPy engine')
+            self.vocabulary: List[str] = weights['vocabulary'].tolist()
+            embedding = weights['embedding']
+            self.denseKernel = self.loadMatrix(weights, 'dense/kernel')
+            self.denseBias = weights['dense/bias']
+            self.layers: List[Dict[str, Any]] = []
+            while f'rnn{len(self.layers)}/kernel' in weights:
+                prefix = f'rnn{len(self.layers)}'
+                self.layers.append(
+                    self.makeLayer(
+                        self.loadMatrix(weights, f'{prefix}/kernel'),
+                        self.loadMatrix(weights, f'{prefix}/recurrentKernel'),
+                        weights[f'{prefix}/bias'],
+                    )
+                )
+
+        self.charToID = {char: i for i, char in enumerate(self.vocabulary)}
+        self.nUnits = self.layers[0]['recurrentKernel'].shape[0]
+        self.skipMask = np.zeros(len(self.vocabulary), dtype=np.float32)
+        self.skipMask[self.charToID['[UNK]']] = -np.inf
+        # the embedding is only ever multiplied with the input kernel of the first layer,
+        # so the product can be looked up per character instead
+        firstLayer = self.layers[0]
+        self.inputTable = embedding @ firstLayer.pop('kernel') + firstLayer['inputBias']
+        self.rng = np.random.default_rng()
+        self.resumableStates = self.modelType in self.resumableModelTypes
+        logger.debug(f'{colorize("NumpyPredictor initialized", "OKGREEN")} {self.modelType}')
+
+    @staticmethod
+    def loadMatrix(weights: Any, name: str) -> Any:
+        """
+        Load a weight matrix, quantized matrices are stored with their scales.
+        """
+        if f'{name}/scales' in weights:
+            return QuantizedMatrix(weights[name], weights[f'{name}/scales'])
+        return weights[name]
+
+    @staticmethod
+    def makeLayer(kernel: Any, recurrentKernel: Any, bias: np.ndarray) -> Dict[str, Any]:
+        """
+        Prepare the weights of a single GRU or LSTM layer.
+        """
+        nUnits = recurrentKernel.shape[0]
+        if kernel.shape[1] == 3 * nUnits:
+            # GRU with reset_after has separate biases for the input and the recurrent kernel
+            return {
+                'cell': 'GRU',
+                'kernel': kernel,
+                'recurrentKernel': recurrentKernel,
+                'inputBias': bias[0],
+                'recurrentBias': bias[1],
+            }
+        return {'cell': 'LSTM', 'kernel': kernel, 'recurrentKernel': recurrentKernel, 'inputBias': bias}
+
+    @staticmethod
+    def gruStep(layer: Dict[str, Any], inputs: np.ndarray, state: np.ndarray) -> np.ndarray:
+        """
+        Single GRU step, inputs already multiplied with the input kernel.
+        """
+        inputZ, inputR, inputH = np.split(inputs, 3, axis=1)
+        recurrentZ, recurrentR, recurrentH = np.split(
+            state @ layer['recurrentKernel'] + layer['recurrentBias'], 3, axis=1
+        )
+        z = sigmoid(inputZ + recurrentZ)
+        r = sigmoid(inputR + recurrentR)
+        h = np.tanh(inputH + r * recurrentH)
+        return z * state + (1.0 - z) * h
+
+    @staticmethod
+    def lstmStep(layer: Dict[str, Any], inputs: np.ndarray, state: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Single LSTM step, inputs already multiplied with the input kernel.
+        """
+        h, c = state
+        i, f, g, o = np.split(inputs + h @ layer['recurrentKernel'], 4, axis=1)
+        c = sigmoid(f) * c + sigmoid(i) * np.tanh(g)
+        h = sigmoid(o) * np.tanh(c)
+        return [h, c]
+
+    def project(self, layerIndex: int, x: np.ndarray) -> np.ndarray:
+        """
+        Multiply the inputs of a layer with its input kernel. x are the character IDs for the first layer.
+        """
+        if layerIndex == 0:
+            return self.inputTable[x]
+        layer = self.layers[layerIndex]
+        return x @ layer['kernel'] + layer['inputBias']
+
+    def initialStates(self, batchSize: int) -> Any:
+        """
+        Zero states in the same layout as the TensorFlow models return them.
+        """
+        def zeros() -> np.ndarray:
+            return np.zeros((batchSize, self.nUnits), dtype=np.float32)
+
+        if self.modelType in ['GRU_1layer', 'GRU_2layer']:
+            return zeros()
+        if self.modelType == 'LSTM_1layer':
+            return [zeros(), zeros()]
+        return [[zeros(), zeros()] for _ in self.layers]
+
+    def runLayer(self, layerIndex: int, x: np.ndarray, state: Any) -> Tuple[np.ndarray, Any]:
+        """
+        Run a layer over a whole sequence, returns the outputs of every step and the final state.
+        """
+        layer = self.layers[layerIndex]
+        inputs = self.project(layerIndex, x)
+        outputs = []
+        for t in range(inputs.shape[1]):
+            if layer['cell'] == 'GRU':
+                state = self.gruStep(layer, inputs[:, t], state)
+                outputs.append(state)
+            else:
+                state = self.lstmStep(layer, inputs[:, t], state)
+                outputs.append(state[0])
+        return np.stack(outputs, axis=1), state
+
+    def runLayers(self, inputIDs: np.ndarray, states: Any) -> Tuple[np.ndarray, Any]:
+        """
+        Feed a sequence of character IDs per row, returns the outputs of the last layer for every step and the new
+        states.
+        """
+        if self.modelType == 'GRU_2layer':
+            # the second layer starts from the final state of the first one, like in the model
+            x, states = self.runLayer(0, inputIDs, states)
+            x, states = self.runLayer(1, x, states)
+        elif self.modelType == 'LSTM_multilayer':
+            x = inputIDs
+            newStates = []
+            for i in range(len(self.layers)):
+                x, state = self.runLayer(i, x, states[i])
+                newStates.append(state)
+            states = newStates
+        else:
+            x, states = self.runLayer(0, inputIDs, states)
+        return x, states
+
+    def forward(self, inputIDs: np.ndarray, states: Any) -> Tuple[np.ndarray, Any]:
+        """
+        Feed a sequence of character IDs per row, returns the logits of the last step and the new states.
+        """
+        x, states = self.runLayers(inputIDs, states)
+        return x[:, -1] @ self.denseKernel + self.denseBias, states
+
+    def crossEntropy(self, text: str, chunkLength: int = 1000) -> float:
+        """
+        Average cross-entropy of predicting every character of a text from the ones before it, in nats.
+
+        :param str text: The text, characters that are not in the vocabulary count as [UNK].
+        :param int chunkLength: The number of characters fed at once, the states carry over between chunks.
+        """
+        ids = self.encode(text)
+        states = self.initialStates(1)
+        total = 0.0
+        for start in range(0, len(ids) - 1, chunkLength):
+            inputIDs = ids[start:start + chunkLength]
+            targets = ids[start + 1:start + chunkLength + 1]
+            x, states = self.runLayers(inputIDs[None, :len(targets)], states)
+            logits = (x[0] @ self.denseKernel + self.denseBias).astype(np.float64)
+            logits -= logits.max(axis=1, keepdims=True)
+            logProbabilities = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            total -= logProbabilities[np.arange(len(targets)), targets].sum()
+        return total / max(1, len(ids) - 1)
+
+    def sample(self, logits: np.ndarray, temperatures: np.ndarray, masks: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Sample one character ID per row, like tf.random.categorical (Gumbel-max trick).
+        """
+        logits = logits / temperatures[:, None] + self.skipMask
+        if masks is not None:
+            logits = logits + masks
+        return np.argmax(logits + self.rng.gumbel(size=logits.shape), axis=1)
+
+    def predictNextChar(
+        self,
+        inputIDs: np.ndarray,
+        states: Any = None,
+        temperature: Optional[np.ndarray] = None,
+        masks: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, Any]:
+        """
+        Feed a sequence of character IDs per row and sample the next ones.
+        """
+        if states is None:
+            states = self.initialStates(len(inputIDs))
+        if temperature is None:
+            temperature = np.full(len(inputIDs), self.defaultTemperature, dtype=np.float32)
+        logits, states = self.forward(inputIDs, states)
+        return self.sample(logits, temperature, masks), states
+
+    def encode(self, text: str) -> np.ndarray:
+        """
+        Convert text to character IDs, unknown characters become [UNK].
+        """
+        unknownID = self.charToID['[UNK]']
+        return np.array([self.charToID.get(char, unknownID) for char in text], dtype=np.int64)
+
+    def feedSeed(self, seed: str, states: Any) -> Tuple[np.ndarray, Any]:
+        """
+        Feed a single seed.
+
+        :param str seed: The seed.
+        :param states: The states to start from, None for the initial states.
+        :return: The logits after the seed and the states, both with a batch size of one.
+        """
+        return self.forward(self.encode(seed)[None, :], self.initialStates(1) if states is None else states)
+
+    def sampleRows(self, logits: np.ndarray, temperatures: List[float], masks: Any = None) -> List[str]:
+        """
+        Sample one character per row from the logits, masks are added to the logits if given.
+        """
+        return [self.vocabulary[i] for i in self.sample(logits, np.array(temperatures, dtype=np.float32), masks)]
+
+    def stepRows(
+        self, chars: List[str], states: Any, temperatures: List[float], masks: Any = None
+    ) -> Tuple[List[str], Any]:
+        """
+        Feed one character per row and predict the next ones.
+
+        :param chars: The last character of every row.
+        :param states: The states of the rows.
+        :param temperatures: The temperature of every row.
+        :param masks: Added to the logits of every row before sampling, if given.
+        :return: The predicted characters and the new states.
+        """
+        predictedIDs, states = self.predictNextChar(
+            np.array([[self.charToID[char]] for char in chars]),
+            states,
+            np.array(temperatures, dtype=np.float32),
+            masks,
+        )
+        return [self.vocabulary[i] for i in predictedIDs], states
+
+    def getVocabulary(self) -> List[str]:
+        return self.vocabulary
+
+    def memoryBytes(self) -> int:
+        """
+        Approximate memory used by the weights of the model in bytes.
+        """
+        arrays = [
+            weight for layer in self.layers for weight in layer.values()
+            if isinstance(weight, (np.ndarray, QuantizedMatrix))
+        ]
+        arrays += [self.inputTable, self.denseKernel, self.denseBias]
+        return sum(array.nbytes for array in arrays)
+
+    def selectStates(self, states: Any, indices: Any) -> Any:
+        """
+        Select the states of the given rows.
+        """
+        return mapStates(lambda state: state[indices], states)
+
+    def concatStates(self, states: List[Any]) -> Any:
+        """
+        Concatenate the states of several batches.
+        """
+        if len(states) == 1:
+            return states[0]
+        return mapStates(lambda *state: np.concatenate(state), *states)
@@ -21,23 +21,142 @@ class Predictor(tf.keras.Model):
         )
         self.skipMask = tf.sparse.to_dense(sparseMask)
 
-    @tf.function
+        # lookup tables for the compiled decode loop
+        self.newlineID = self.charToID('\n')
+        self.spaceTable = tf.constant([char.isspace() for char in self.charToID.get_vocabulary()])
+
+    @tf.function(reduce_retracing=True)
     def predictNextChar(
-        self, inputs, states=None, temperature: Optional[float] = None
+        self, inputs, states=None, temperature: Optional[Any] = None, mask: Optional[Any] = None
     ) -> Tuple[Any, Any]:
-        if not temperature:
-            temperature = self.temperature
+        predictedLogits, states = self.feed(inputs, states)
+        return self.sample(predictedLogits, temperature, mask), states
+
+    @tf.function(reduce_retracing=True)
+    def feed(self, inputs, states=None) -> Tuple[Any, Any]:
         inputChars = tf.strings.unicode_split(inputs, 'UTF-8')
         inputIDs = self.charToID(inputChars).to_tensor()
 
         predictedLogits, states = self.model(inputIDs, states=states, returnState=True)
-        predictedLogits = predictedLogits[:, -1, :]
+        return predictedLogits[:, -1, :], states
+
+    @tf.function(reduce_retracing=True)
+    def sample(self, predictedLogits, temperature: Optional[Any] = None, mask: Optional[Any] = None) -> Any:
+        # temperature is either a scalar or a column of per-row temperatures
+        if temperature is None:
+            temperature = self.temperature
         predictedLogits /= temperature
         predictedLogits += self.skipMask
+        # banned words, one row per batch row
+        if mask is not None:
+            predictedLogits += mask
 
         predictedIDs = tf.random.categorical(predictedLogits, num_samples=1)
         predictedIDs = tf.squeeze(predictedIDs, axis=-1)
 
-        predictedChars = self.IDToChar(predictedIDs)
+        return self.IDToChar(predictedIDs)
+
+    @tf.function(
+        input_signature=[
+            tf.TensorSpec([None, None], tf.int64),
+            tf.TensorSpec([None], tf.int32),
+            tf.TensorSpec([None], tf.bool),
+            tf.TensorSpec([None], tf.float32),
+            tf.TensorSpec([], tf.int32),
+            tf.TensorSpec([None, None], tf.int32),
+            tf.TensorSpec([None, None], tf.float32),
+            tf.TensorSpec([None], tf.int32),
+        ]
+    )
+    def generate(
+        self, seedIDs, seedLengths, seedHasContent, temperature, maxLength, transitions, masks, automatonStart
+    ) -> Tuple[Any, Any]:
+        """
+        Generate one message per row as a single graph, working on IDs only.
+        Follows the same stop rules as GeneratedMessage, the seeds are fed inside the loop one character at a time,
+        which only gives the states of feeding them at once for models with resumable states.
+        Characters that would complete a banned word are masked with the tables of a BannedWordAutomaton.
+
+        :param seedIDs: Right padded seed IDs, shape (batch, seed length).
+        :param seedLengths: Length of every seed.
+        :param seedHasContent: Whether every seed contains non whitespace characters.
+        :param temperature: Temperature of every row.
+        :param maxLength: Maximum number of characters to generate.
+        :param transitions: The transitions of the banned word automaton.
+        :param masks: The logit masks of the automaton states.
+        :param automatonStart: The automaton state after the seed of every row.
+        :return: The generated text and whether the seed is kept, for every row.
+        """
+        batchSize = tf.shape(seedIDs)[0]
+        seedWidth = tf.shape(seedIDs)[1]
+        zeros = tf.zeros([batchSize], tf.int32)
+
+        predictedLogits, states = self.model(seedIDs[:, :1], states=None, returnState=True)
+        predictedLogits = predictedLogits[:, -1, :]
+
+        def condition(step, predictedLogits, states, output, done, *_):
+            return tf.logical_and(step < seedWidth + maxLength, tf.logical_not(tf.reduce_all(done)))
+
+        def body(step, predictedLogits, states, output, done, start, end, count, seedLength, hasContent, keepSeed, generated, automatonState):  # noqa: E501
+            predictedLogits = predictedLogits / temperature[:, None] + self.skipMask + tf.gather(masks, automatonState)
+            predictedIDs = tf.squeeze(tf.random.categorical(predictedLogits, num_samples=1), axis=-1)
+            output = output.write(step - 1, predictedIDs)
+
+            # the row has consumed its whole seed, the sampled character is part of the message
+            active = tf.logical_and(step >= seedLengths, tf.logical_not(done))
+            isNewline = tf.equal(predictedIDs, self.newlineID)
+            newCount = count + 1
+            newHasContent = tf.logical_or(hasContent, tf.logical_not(tf.gather(self.spaceTable, predictedIDs)))
+            newGenerated = generated + 1
+            finished = tf.logical_and(isNewline, tf.logical_and(newCount > 3, newHasContent))
+            reset = tf.logical_and(isNewline, tf.logical_not(finished))
+            newCount = tf.where(reset, 0, newCount)
+            newHasContent = tf.logical_and(newHasContent, tf.logical_not(reset))
+            newSeedLength = tf.where(reset, 0, seedLength)
+            # maximum discord message length is 2000
+            finished = finished | (newSeedLength + newCount >= 1999) | (newGenerated >= maxLength)
+
+            done = tf.logical_or(done, tf.logical_and(active, finished))
+            start = tf.where(tf.logical_and(active, reset), step, start)
+            end = tf.where(active, step, end)
+            count = tf.where(active, newCount, count)
+            seedLength = tf.where(active, newSeedLength, seedLength)
+            hasContent = tf.where(active, newHasContent, hasContent)
+            keepSeed = tf.logical_and(keepSeed, tf.logical_not(tf.logical_and(active, reset)))
+            generated = tf.where(active, newGenerated, generated)
+            # a newline leads back to the root, the same as the reset of the message
+            nextState = tf.gather_nd(transitions, tf.stack([automatonState, tf.cast(predictedIDs, tf.int32)], axis=1))
+            automatonState = tf.where(active, nextState, automatonState)
+
+            seedColumn = tf.gather(seedIDs, tf.minimum(step, seedWidth - 1), axis=1)
+            inputIDs = tf.where(step < seedLengths, seedColumn, predictedIDs)
+            predictedLogits, states = self.model(inputIDs[:, None], states=states, returnState=True)
+            predictedLogits = predictedLogits[:, -1, :]
+            return (
+                step + 1, predictedLogits, states, output, done, start, end, count, seedLength, hasContent, keepSeed,
+                generated, automatonState,
+            )
+
+        loopVars = (
+            tf.constant(1),
+            predictedLogits,
+            states,
+            tf.TensorArray(tf.int64, size=0, dynamic_size=True),
+            tf.zeros([batchSize], tf.bool),
+            seedLengths - 1,
+            seedLengths - 1,
+            zeros,
+            seedLengths,
+            seedHasContent,
+            tf.ones([batchSize], tf.bool),
+            zeros,
+            automatonStart,
+        )
+        _, _, _, output, _, start, end, *_, keepSeed, _, _ = tf.while_loop(condition, body, loopVars)
 
-        return predictedChars, states
+        # only decode the IDs to strings once, at the very end
+        outputIDs = tf.transpose(output.stack())
+        positions = tf.range(tf.shape(outputIDs)[1])[None, :]
+        inMessage = tf.logical_and(positions >= start[:, None], positions < end[:, None])
+        predictedChars = self.IDToChar(tf.ragged.boolean_mask(outputIDs, inMessage))
+        return tf.strings.reduce_join(predictedChars, axis=1), keepSeed
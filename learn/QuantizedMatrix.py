@@ -0,0 +1,54 @@
+from typing import Any, Tuple
+
+import numpy as np
+
+
+class QuantizedMatrix:
+    """
+    Weight matrix stored as int8 with one float32 scale per output column, a quarter of the memory of float32.
+    Multiplied from the left like an array, x @ matrix, the int8 rows are converted to float32 a block at a time
+    so the full float32 matrix never exists.
+    This only saves memory. NumPy has no int8 matrix product, so every product still converts all the values to
+    float32 first, and a single row is multiplied slower than with the float32 matrix.
+    """
+    # makes numpy hand x @ matrix over to __rmatmul__
+    __array_ufunc__ = None
+    # bytes of the float32 block converted at a time, small enough to stay in the cache
+    blockBytes = 1 << 20
+
+    def __init__(self, values: np.ndarray, scales: np.ndarray) -> None:
+        self.values = values
+        self.scales = scales
+        self.shape: Tuple[int, ...] = values.shape
+        self.blockRows = max(1, self.blockBytes // (4 * values.shape[1]))
+
+    @classmethod
+    def quantize(cls, weights: np.ndarray) -> 'QuantizedMatrix':
+        """
+        Quantize a float matrix symmetrically, per output column.
+        """
+        scales = np.abs(weights).max(axis=0) / 127
+        scales[scales == 0] = 1.0
+        values = np.clip(np.rint(weights / scales), -127, 127).astype(np.int8)
+        return cls(values, scales.astype(np.float32))
+
+    def dequantize(self) -> np.ndarray:
+        return self.values.astype(np.float32) * self.scales
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.scales.nbytes
+
+    def __rmatmul__(self, x: Any) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        rows = x.reshape(-1, x.shape[-1])
+        result = np.zeros((len(rows), self.shape[1]), dtype=np.float32)
+        # every block is converted into the same buffer instead of a new array
+        buffer = np.empty((min(self.blockRows, self.shape[0]), self.shape[1]), dtype=np.float32)
+        for start in range(0, self.shape[0], self.blockRows):
+            end = min(start + self.blockRows, self.shape[0])
+            block = buffer[:end - start]
+            np.copyto(block, self.values[start:end], casting='unsafe')
+            result += rows[:, start:end] @ block
+        result *= self.scales
+        return result.reshape(*x.shape[:-1], self.shape[1])
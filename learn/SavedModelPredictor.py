@@ -0,0 +1,110 @@
+import logging
+from typing import Any, List, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from learn.BatchDecoder import BatchDecoder
+from utils.configReader import readConfig
+from utils.colorizer import colorize
+
+config = readConfig()
+logger = logging.getLogger('ai.learn.savedmodelpredictor')
+
+
+class SavedModelPredictor(BatchDecoder):
+    """
+    Prediction engine that runs a model exported with ServingModule. Nothing is rebuilt or traced when it loads,
+    the vocabulary is part of the export.
+    """
+    def __init__(self, directory: str, temperature: float = 1.0, **kwargs) -> None:
+        self.maxPredictionLength = config['prediction']['maxPredictionLength']
+        self.defaultTemperature = temperature
+        for option in kwargs.keys():
+            if hasattr(self, option) and isinstance(getattr(self, option), type(kwargs[option])):
+                setattr(self, option, kwargs[option])
+
+        self.module = tf.saved_model.load(directory)
+        self.vocabulary: List[str] = [char.decode('utf-8') for char in self.module.vocabulary.numpy()]
+        self.charToID = {char: i for i, char in enumerate(self.vocabulary)}
+        self.skipMask = self.module.skipMask.numpy()
+        self.stateCount, self.nUnits = self.module.stateShape.numpy().tolist()
+        self.modelType = self.module.modelType.numpy().decode('utf-8')
+        self.resumableStates = self.modelType in self.resumableModelTypes
+        self.rng = np.random.default_rng()
+        logger.debug(f'{colorize("SavedModelPredictor initialized", "OKGREEN")} {self.modelType}')
+
+    def initialStates(self, batchSize: int) -> Any:
+        return tf.zeros([self.stateCount, batchSize, self.nUnits])
+
+    def encode(self, text: str) -> np.ndarray:
+        """
+        Convert text to character IDs, unknown characters become [UNK].
+        """
+        unknownID = self.charToID['[UNK]']
+        return np.array([self.charToID.get(char, unknownID) for char in text], dtype=np.int64)
+
+    def feedSeed(self, seed: str, states: Any) -> Tuple[Any, Any]:
+        """
+        Feed a single seed.
+
+        :param str seed: The seed.
+        :param states: The states to start from, None for the initial states.
+        :return: The logits after the seed and the states, both with a batch size of one.
+        """
+        result = self.module.step(
+            self.encode(seed)[None, :], self.initialStates(1) if states is None else states, tf.ones([1])
+        )
+        return result['logits'], result['states']
+
+    def sampleRows(self, logits: Any, temperatures: List[float], masks: Any = None) -> List[str]:
+        """
+        Sample one character per row from the logits (Gumbel-max trick), masks are added to the logits if given.
+        """
+        logits = logits.numpy() / np.array(temperatures, dtype=np.float32)[:, None] + self.skipMask
+        if masks is not None:
+            logits = logits + masks
+        return [self.vocabulary[i] for i in np.argmax(logits + self.rng.gumbel(size=logits.shape), axis=1)]
+
+    def stepRows(
+        self, chars: List[str], states: Any, temperatures: List[float], masks: Any = None
+    ) -> Tuple[List[str], Any]:
+        """
+        Feed one character per row and predict the next ones.
+
+        :param chars: The last character of every row.
+        :param states: The states of the rows.
+        :param temperatures: The temperature of every row.
+        :param masks: Added to the logits of every row before sampling, if given.
+        :return: The predicted characters and the new states.
+        """
+        result = self.module.step(
+            np.array([[self.charToID[char]] for char in chars]), states, np.array(temperatures, dtype=np.float32)
+        )
+        if masks is not None:
+            # the step samples without the masks, sample again from its logits
+            return self.sampleRows(result['logits'], temperatures, masks), result['states']
+        return [self.vocabulary[i] for i in result['ids'].numpy()], result['states']
+
+    def selectStates(self, states: Any, indices: List[int]) -> Any:
+        """
+        Select the rows of the stacked states or of logits, the rows are the second to last axis of both.
+        """
+        return tf.gather(states, indices, axis=len(states.shape) - 2)
+
+    def concatStates(self, states: List[Any]) -> Any:
+        """
+        Concatenate the states or logits of several batches.
+        """
+        if len(states) == 1:
+            return states[0]
+        return tf.concat(states, axis=len(states[0].shape) - 2)
+
+    def getVocabulary(self) -> List[str]:
+        return self.vocabulary
+
+    def memoryBytes(self) -> int:
+        """
+        Approximate memory used by the weights of the model in bytes.
+        """
+        return sum(variable.shape.num_elements() * variable.dtype.size for variable in self.module.modelVariables)
@@ -0,0 +1,58 @@
+from typing import Any, List
+
+import tensorflow as tf
+
+from utils.nestedStates import flattenStates
+
+
+class ServingModule(tf.Module):
+    """
+    Self-contained serving artifact of a model: the weights, the vocabulary and a single step function,
+    saved as a SavedModel. The states of every model type are stacked into one tensor of shape
+    (number of state tensors, batch size, nUnits), so the step has one concrete signature.
+    """
+    def __init__(self, model: Any, vocabulary: List[str], modelType: str) -> None:
+        super().__init__()
+        # only the variables are saved, not the Keras model with all its functions, which is slow to load
+        self.modelVariables = list(model.variables)
+        self.vocabulary = tf.Variable(vocabulary, trainable=False)
+        self.modelType = tf.Variable(modelType, trainable=False)
+        self.skipMask = tf.Variable(
+            [-float('inf') if char == '[UNK]' else 0.0 for char in vocabulary], trainable=False
+        )
+        # run the model once to get the layout of its states
+        _, states = model(tf.zeros([1, 1], tf.int64), returnState=True)
+        stateCount = len(flattenStates(states))
+        self.stateShape = tf.Variable([stateCount, int(flattenStates(states)[0].shape[-1])], trainable=False)
+        stateLayout = states
+
+        @tf.function(
+            input_signature=[
+                tf.TensorSpec([None, None], tf.int64),
+                tf.TensorSpec([stateCount, None, None], tf.float32),
+                tf.TensorSpec([None], tf.float32),
+            ]
+        )
+        def step(ids, states, temperature):
+            """
+            Feed a sequence of character IDs per row and sample the next ones.
+
+            :param ids: The character IDs, shape (batch, length).
+            :param states: The stacked states of the rows, zeros for new rows.
+            :param temperature: The temperature of every row.
+            :return: The sampled IDs, the logits of the last step and the new stacked states.
+            """
+            nestedStates = tf.nest.pack_sequence_as(stateLayout, tf.unstack(states, num=stateCount))
+            logits, newStates = model(ids, states=nestedStates, returnState=True)
+            logits = logits[:, -1, :]
+            sampledIDs = tf.random.categorical(logits / temperature[:, None] + self.skipMask, num_samples=1)
+            return {
+                'ids': tf.squeeze(sampledIDs, axis=-1),
+                'logits': logits,
+                'states': tf.stack(flattenStates(newStates)),
+            }
+
+        self.step = step
+
+    def save(self, directory: str) -> None:
+        tf.saved_model.save(self, directory, signatures={'step': self.step})
@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from utils.nestedStates import flattenStates
+
+
+class StateCache:
+    """
+    LRU cache of the logits and states of a model after feeding a seed, limited by a memory budget.
+    Lookups return the longest cached prefix of a seed, so only the rest of it has to be fed.
+    """
+    def __init__(self, budgetBytes: int, exactOnly: bool = False) -> None:
+        self.budgetBytes = budgetBytes
+        self.exactOnly = exactOnly
+        self.entries: 'OrderedDict[str, Tuple[Any, Any, int]]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.partialHits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def byteSize(tensor: Any) -> int:
+        """
+        Size of a NumPy array or TensorFlow tensor in bytes.
+        """
+        count = 1
+        for dimension in tensor.shape:
+            count *= int(dimension)
+        itemSize = getattr(tensor.dtype, 'itemsize', None) or tensor.dtype.size
+        return count * itemSize
+
+    def lookup(self, seed: str) -> Tuple[int, Any, Any]:
+        """
+        Find the longest cached prefix of the seed.
+
+        :param str seed: The seed.
+        :return: The length of the prefix and its logits and states, or 0 and None if nothing is cached.
+        """
+        lengths = [len(seed)] if self.exactOnly else range(len(seed), 0, -1)
+        with self.lock:
+            for length in lengths:
+                entry = self.entries.get(seed[:length])
+                if entry:
+                    self.entries.move_to_end(seed[:length])
+                    if length == len(seed):
+                        self.hits += 1
+                    else:
+                        self.partialHits += 1
+                    return length, entry[0], entry[1]
+            self.misses += 1
+        return 0, None, None
+
+    def store(self, seed: str, logits: Any, states: Any) -> None:
+        """
+        Store the logits and states after feeding the seed, evicting the least recently used entries if needed.
+        """
+        size = sum(self.byteSize(tensor) for tensor in flattenStates([logits, states]))
+        if size > self.budgetBytes:
+            return
+        with self.lock:
+            if seed in self.entries:
+                self.size -= self.entries.pop(seed)[2]
+            self.entries[seed] = (logits, states, size)
+            self.size += size
+            while self.size > self.budgetBytes:
+                self.size -= self.entries.popitem(last=False)[1][2]
+
+    def getStats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'partialHits': self.partialHits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,170 @@
+import csv
+import itertools
+import logging
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import path
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List, MutableMapping
+
+import numpy as np
+import tensorflow as tf
+
+import utils.distribution
+from learn.MedianPruningCallback import MedianPruningCallback
+from learn.Trainer import Trainer
+from learn.TrustedRNN import TrustedRNN
+from utils.configReader import readConfig
+from utils.colorizer import colorize
+
+config_ = readConfig()
+config: Dict[str, Any] = config_['learn']
+logger = logging.getLogger('ai.learn.sweeprunner')
+
+
+def initializeTrialProcess(threads: int) -> None:
+    """
+    Limit the CPU threads of TensorFlow in a trial process, runs before anything else uses TensorFlow.
+    """
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    # trials always train on a single worker
+    utils.distribution.strategy = tf.distribute.get_strategy()
+
+
+def runTrial(
+    trial: Dict[str, Any], idsFile: str, vocab: List[str], pruningStore: MutableMapping[str, float]
+) -> Dict[str, Any]:
+    """
+    Train one trial of a sweep and report how it did.
+
+    :param trial: The index, run name and options of the trial.
+    :param str idsFile: The processed corpus, shared by all trials.
+    :param vocab: The vocabulary of the corpus.
+    :param pruningStore: The monitored values of all trials, for pruning.
+    """
+    settings = config['sweep']
+    monitor = config['training']['earlyStopping']['monitor']
+    start = time.perf_counter()
+    pruning = MedianPruningCallback(
+        trial['trial'],
+        pruningStore,
+        monitor,
+        settings['pruning']['startEpoch'],
+        settings['pruning']['minTrials'],
+    )
+    rnn = TrustedRNN(
+        vocab,
+        ids=np.load(idsFile, mmap_mode='r'),
+        runName=trial['runName'],
+        verbose=0,
+        extraCallbacks=[pruning] if settings['pruning']['usePruning'] else [],
+        **trial['options'],
+    )
+    rnn.makeDataset()
+    rnn.makeModel()
+    rnn.trainModel()
+    history: List[float] = rnn.history.history.get(monitor, []) if rnn.history else []  # type: ignore
+    best = (max if pruning.higherIsBetter else min)(history) if history else float('nan')
+    return {
+        'trial': trial['trial'],
+        'runName': trial['runName'],
+        **trial['options'],
+        monitor: best,
+        'epochs': len(history),
+        'pruned': pruning.pruned,
+        'seconds': round(time.perf_counter() - start, 1),
+    }
+
+
+class SweepRunner:
+    """
+    Trains several variants of the model on a process pool and writes a table of the results.
+    The search space maps model and training options, like model.nUnits, to lists of values.
+    """
+    def __init__(self) -> None:
+        self.settings = config['sweep']
+        self.runName = config['run']['runName']
+        self.monitor = config['training']['earlyStopping']['monitor']
+
+    def getOptions(self) -> List[Dict[str, Any]]:
+        """
+        Get the options of every trial, all combinations for a grid search or random ones for a random search.
+        """
+        # the options are passed to TrustedRNN, which only takes the ones it has an attribute for
+        defaults = TrustedRNN(['a'])
+        space: Dict[str, List[Any]] = {}
+        for key, values in self.settings['space'].items():
+            section, option = key.split('.', 1)
+            if (
+                section not in ('model', 'training')
+                or option not in config[section]
+                or getattr(defaults, option, None) != config[section][option]
+            ):
+                raise ValueError(f'{key} is not an option of TrustedRNN in learn.model or learn.training.')
+            space[option] = values
+        if self.settings['method'] == 'random':
+            return [
+                {option: random.choice(values) for option, values in space.items()}
+                for _ in range(self.settings['trials'])
+            ]
+        return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        Process the corpus once and train all trials on it.
+
+        :return: The results of the trials, best first.
+        """
+        trials = [
+            {'trial': i, 'runName': f'{self.runName}_trial{i:03d}', 'options': options}
+            for i, options in enumerate(self.getOptions())
+        ]
+        logger.info(f'{colorize("Starting sweep", "OKBLUE")} {self.runName} with {len(trials)} trials')
+        ids, vocab = Trainer().loadCorpus()
+        results = []
+        # spawned, TensorFlow doesn't survive a fork, and one trial per process so every trial starts clean
+        context = multiprocessing.get_context('spawn')
+        with TemporaryDirectory() as directory, context.Manager() as manager:
+            idsFile = path.join(directory, 'ids.npy')
+            np.save(idsFile, ids)
+            pruningStore = manager.dict()
+            with ProcessPoolExecutor(
+                self.settings['workers'],
+                mp_context=context,
+                initializer=initializeTrialProcess,
+                initargs=(self.settings['threadsPerWorker'],),
+                max_tasks_per_child=1,
+            ) as executor:
+                futures = {executor.submit(runTrial, trial, idsFile, vocab, pruningStore): trial for trial in trials}
+                for future in as_completed(futures):
+                    trial = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as err:
+                        logger.error(colorize(f'Trial {trial["trial"]} failed: {err}', 'FAIL'))
+                        result = {'trial': trial['trial'], 'runName': trial['runName'], **trial['options']}
+                    logger.info(f'{colorize("Finished trial", "OKGREEN")} {result}')
+                    results.append(result)
+        results.sort(key=self.sortKey)
+        self.writeResults(results)
+        return results
+
+    def sortKey(self, result: Dict[str, Any]) -> float:
+        value = result.get(self.monitor, float('nan'))
+        if value != value:
+            return float('inf')
+        return -value if 'acc' in self.monitor else value
+
+    def writeResults(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Write the results to the results file, one row per trial.
+        """
+        columns = list(dict.fromkeys(column for result in results for column in result))
+        with open(self.settings['resultsFile'], 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            writer.writerows(results)
+        logger.info(f'{colorize("Sweep results written to", "OKGREEN")} {self.settings["resultsFile"]}')
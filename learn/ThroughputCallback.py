@@ -0,0 +1,146 @@
+import json
+import logging
+import sys
+import time
+from os import makedirs, path
+from typing import Any, Dict, List, Optional
+
+import tensorflow as tf
+
+from utils.colorizer import colorize
+from utils.distribution import isChief
+
+logger = logging.getLogger('ai.learn.throughputcallback')
+
+
+def getPeakRSSMB() -> Optional[float]:
+    """
+    Peak resident memory of the process in MB, None where the resource module doesn't exist (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+class ThroughputCallback(tf.keras.callbacks.Callback):
+    """
+    Records the training throughput: steps and characters per second, the time the input pipeline takes to produce
+    a batch on its own compared to a whole training step, and the peak memory of the process.
+    Written to TensorBoard every epoch and to a JSON summary at the end of the training, by the chief only.
+    If producing a batch takes about as long as a training step, the training is bound by the input pipeline.
+    """
+    def __init__(
+        self,
+        charsPerStep: int,
+        logDir: str,
+        summaryFile: str,
+        dataset: Any = None,
+        probeSteps: int = 20,
+        warmupSteps: int = 2,
+    ) -> None:
+        super().__init__()
+        self.charsPerStep = charsPerStep
+        self.logDir = logDir
+        self.summaryFile = summaryFile
+        self.dataset = dataset
+        self.probeSteps = probeSteps
+        self.warmupSteps = warmupSteps
+        self.inputSecondsPerStep: Optional[float] = None
+        self.epochs: List[Dict[str, Any]] = []
+        self.totalSteps = 0
+        self.epochSteps = 0
+        self.epochSeconds = 0.0
+        self.lastBatchEnd: Optional[float] = None
+        self.writer: Any = None
+        self.chief = True
+
+    def probeInput(self) -> Optional[float]:
+        """
+        Time the input pipeline alone, without training.
+
+        :return: The seconds it takes to produce a batch, None if there is no dataset to probe.
+        """
+        if self.dataset is None or not self.probeSteps:
+            return None
+        iterator = iter(self.dataset)
+        next(iterator)
+        count = 0
+        start = time.perf_counter()
+        for _ in range(self.probeSteps):
+            try:
+                next(iterator)
+            except StopIteration:
+                break
+            count += 1
+        return (time.perf_counter() - start) / count if count else None
+
+    def on_train_begin(self, logs: Any = None) -> None:
+        self.inputSecondsPerStep = self.probeInput()
+        # the other workers of a multi-worker training would write to the same files
+        self.chief = isChief()
+        if self.chief:
+            self.writer = tf.summary.create_file_writer(path.join(self.logDir, 'throughput'))
+
+    def on_epoch_begin(self, epoch: int, logs: Any = None) -> None:
+        self.epochSteps = 0
+        self.epochSeconds = 0.0
+        self.lastBatchEnd = None
+
+    def on_train_batch_begin(self, batch: int, logs: Any = None) -> None:
+        if self.lastBatchEnd is None:
+            self.lastBatchEnd = time.perf_counter()
+
+    def on_train_batch_end(self, batch: int, logs: Any = None) -> None:
+        now = time.perf_counter()
+        # the first steps include tracing the training function
+        if self.totalSteps >= self.warmupSteps:
+            self.epochSteps += 1
+            self.epochSeconds += now - self.lastBatchEnd  # type: ignore
+        self.totalSteps += 1
+        self.lastBatchEnd = now
+
+    def getStats(self, epoch: int) -> Dict[str, Any]:
+        stepSeconds = self.epochSeconds / self.epochSteps if self.epochSteps else None
+        stats: Dict[str, Any] = {
+            'epoch': epoch + 1,
+            'steps': self.epochSteps,
+            'stepsPerSecond': 1 / stepSeconds if stepSeconds else None,
+            'charsPerSecond': self.charsPerStep / stepSeconds if stepSeconds else None,
+            'stepSeconds': stepSeconds,
+            'inputSecondsPerStep': self.inputSecondsPerStep,
+            'inputShare': self.inputSecondsPerStep / stepSeconds if stepSeconds and self.inputSecondsPerStep else None,
+            'peakRSSMB': getPeakRSSMB(),
+        }
+        return stats
+
+    def on_epoch_end(self, epoch: int, logs: Any = None) -> None:
+        stats = self.getStats(epoch)
+        self.epochs.append(stats)
+        if not self.chief:
+            return
+        with self.writer.as_default():
+            for name, value in stats.items():
+                if name != 'epoch' and value is not None:
+                    tf.summary.scalar(f'throughput/{name}', value, step=epoch)
+        self.writer.flush()
+
+    def on_train_end(self, logs: Any = None) -> None:
+        if not self.epochs:
+            return
+        last = self.epochs[-1]
+        if self.chief:
+            summary = {'charsPerStep': self.charsPerStep, 'last': last, 'epochs': self.epochs}
+            if path.dirname(self.summaryFile):
+                makedirs(path.dirname(self.summaryFile), exist_ok=True)
+            with open(self.summaryFile, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=4)
+        if last['stepsPerSecond']:
+            inputShare = f'{last["inputShare"]:.0%}' if last['inputShare'] else 'unknown'
+            logger.info(
+                f'{colorize("Throughput", "OKGREEN")} {last["stepsPerSecond"]:.2f} steps/s, '
+                f'{last["charsPerSecond"]:.0f} chars/s, input pipeline takes {inputShare} of a step'
+            )
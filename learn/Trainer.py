@@ -1,27 +1,69 @@
 import logging
-from typing import Optional
+from os import path
+from typing import List, Optional, Tuple
 
-from learn.DataProcessor import DataProcessor
+import numpy as np
+
+from learn.CorpusCache import CorpusCache
+from learn.IncrementalCorpus import IncrementalCorpus
 from learn.TrustedRNN import TrustedRNN
 from utils.configReader import readConfig
 from utils.colorizer import colorize
+from utils.distribution import getStrategy, isChief
+from utils.inputFiles import getInputFiles
 
-config = readConfig()
-config = config['learn']['run']
+config_ = readConfig()
+dataConfig = config_['learn']['data']
+config = config_['learn']['run']
 
 logger = logging.getLogger('ai.learn.trainer')
 
 
 class Trainer:
     def __init__(self):
-        self.dp = DataProcessor()
         self.rnn: Optional[TrustedRNN] = None
+        self.corpusCache = CorpusCache(dataConfig['corpusCache']['path'])
+
+    def loadCorpus(self) -> Tuple[np.ndarray, List[str]]:
+        """
+        Get the character IDs and the vocabulary of the processed input data, from the corpus cache if possible.
+        """
+        useCorpusCache = dataConfig['corpusCache']['useCorpusCache']
+        settings = {key: value for key, value in dataConfig.items() if key not in ('corpusCache', 'workers')}
+        if useCorpusCache and dataConfig['corpusCache']['incremental']:
+            corpus = IncrementalCorpus(path.join(dataConfig['corpusCache']['path'], 'incremental'))
+            return corpus.update(getInputFiles(), settings)
+        if useCorpusCache:
+            key = self.corpusCache.computeKey(getInputFiles(), settings)
+            cached = self.corpusCache.load(key)
+            if cached:
+                return cached
+        text, vocab = self.processInputData()
+        if not useCorpusCache:
+            return CorpusCache.encode(text, vocab), vocab
+        return self.corpusCache.store(key, text, vocab), vocab
+
+    @staticmethod
+    def processInputData() -> Tuple[str, List[str]]:
+        # pandas is only imported when the data has to be processed
+        from learn.DataProcessor import DataProcessor
+
+        return DataProcessor().processInputData()
+
+    @staticmethod
+    def exportVocab(vocab: List[str], fileName: str) -> None:
+        with open(fileName, 'w', encoding='utf-8') as f:
+            f.write(''.join(vocab))
+        logger.debug('Vocabulary exported.')
 
     def run(self) -> None:
         try:
             logger.info(colorize('Starting full training sequence', 'BLUE', 'BACKGROUND_WHITE'))
-            text, vocab = self.dp.processInputData()
-            self.dp.exportVocab(f'{config["vocabPath"]}vocab_{config["runName"]}.txt')
+            # the strategy has to exist before any other TensorFlow operation
+            getStrategy()
+            ids, vocab = self.loadCorpus()
+            if isChief():
+                self.exportVocab(vocab, f'{config["vocabPath"]}vocab_{config["runName"]}.txt')
             logger.info(
                 colorize(
                     'Data processing completed. Starting training...',
@@ -29,7 +71,7 @@ class Trainer:
                     'BACKGROUND_WHITE',
                 )
             )
-            self.rnn = TrustedRNN(vocab, text, runName=config['runName'])
+            self.rnn = TrustedRNN(vocab, ids=ids, runName=config['runName'])
             self.rnn.makeDataset()
             self.rnn.makeModel()
             self.rnn.trainModel()
@@ -37,10 +79,11 @@ class Trainer:
             self.rnn.saveModelWeights(f'final_weights_{config["runName"]}')
             if config['pickleHistory']:
                 self.rnn.pickleHistory(f'history_{config["runName"]}')
+            if not isChief():
+                return
             self.rnn.makePredictor()
             logger.info(colorize('Making some predictions to check', 'BLUE', 'BACKGROUND_WHITE'))
-            for _ in range(20):
-                self.rnn.predict('\n')
+            self.rnn.predictBatch('\n', n=20)
         except Exception as err:
             logger.error(colorize(f'{err}', 'FAIL'))
             raise
@@ -1,21 +1,34 @@
 import logging
-from os import path
+from glob import glob
+from os import makedirs, path, remove
 from importlib import import_module
 from pickle import dump
-from typing import Dict, Any, List, Optional
+from tempfile import TemporaryDirectory
+from typing import Dict, Any, List, Optional, Tuple, Union
 
+import numpy as np
 import tensorflow as tf
 
+from learn.BannedWordAutomaton import BannedWordAutomaton
+from learn.BatchDecoder import BatchDecoder
+from learn.CorpusCache import CorpusCache
+from learn.GeneratedMessage import GeneratedMessage
+from learn.NumpyPredictor import NumpyPredictor
 from learn.Predictor import Predictor
+from learn.QuantizedMatrix import QuantizedMatrix
+from learn.ServingModule import ServingModule
+from learn.ThroughputCallback import ThroughputCallback
 from utils.configReader import readConfig
 from utils.colorizer import colorize
+from utils.distribution import getStrategy, isChief
+from utils.nestedStates import mapStates
 
 config_ = readConfig()
 config: Dict[str, Any] = config_['learn']
 logger = logging.getLogger('ai.learn.trustedrnn')
 
 
-class TrustedRNN:
+class TrustedRNN(BatchDecoder):
     """
     Class to build, train and load the RNN model
     """
@@ -24,6 +37,7 @@ class TrustedRNN:
         self,
         vocab: List[str],
         text: Optional[str] = None,
+        ids: Optional[np.ndarray] = None,
         **kwargs,
     ) -> None:
 
@@ -42,9 +56,18 @@ class TrustedRNN:
         self.checkpointSaveBestOnly = config['training']['checkpoints']['saveBestOnly']
         self.checkpointMonitor = config['training']['checkpoints']['monitor']
         self.layers = config['model']['layers']
+        self.stateful = config['training']['stateful']
+        self.mixedPrecision = config['training']['mixedPrecision']
+        self.jitCompile = config['training']['jitCompile']
+        self.datasetFormat = config['training']['dataset']['format']
+        self.tfrecordShards = config['training']['dataset']['tfrecordShards']
+        self.tfrecordPath = config['training']['dataset']['tfrecordPath']
+        self.datasetSnapshotPath = config['training']['dataset']['snapshotPath']
         self.text = text
+        self.ids = ids
         self.vocab = vocab
         self.dataset = None
+        self.stepsPerEpoch: Optional[int] = None
         self.model = None
         self.history = None
         self.predictor = None
@@ -53,13 +76,16 @@ class TrustedRNN:
         self.earlyStoppingRestoreBestWeights = config['training']['earlyStopping']['restoreBestWeights']
         self.earlyStoppingMonitor = config['training']['earlyStopping']['monitor']
         self.maxPredictionLength = config_['prediction']['maxPredictionLength']
+        self.compiledDecode = config_['prediction']['compiledDecode']
         self.printSummary = False
+        self.extraCallbacks: List[Any] = []
         for option in kwargs.keys():
             if hasattr(self, option) and isinstance(getattr(self, option), type(kwargs[option])):
                 setattr(self, option, kwargs[option])
             else:
                 logger.warning(colorize(f'{option} is not a valid option, using default.', 'WARNING'))
         self.checkpointPrefix += f'_{self.runName}'
+        self.resumableStates = self.modelType in self.resumableModelTypes
 
         # dynamically import the RNN model
         self.RNNModel = import_module(f'learn.models.{self.modelType}')
@@ -77,33 +103,174 @@ class TrustedRNN:
         Builds the model, loads the weights from checkpoints and prepares it for prediction.
         """
         logger.debug('Loading model with weights')
+        # mixed precision is only used for training
+        self.mixedPrecision = ''
         self.makeModel()
         self.loadModelWeights(self.checkpointPrefix)
         self.makePredictor()
 
     def makeDataset(self) -> None:
         """
-        Create the dataset for training of the model.
+        Create the dataset for training of the model, from the character IDs if passed, otherwise from the text.
+        The sequences are streamed from a memory map of the IDs or from TFRecord shards,
+        so the memory used doesn't grow with the size of the corpus.
+        When training on several replicas, every input pipeline reads its own part of the sequences
+        and batchSize is the batch size per replica.
         """
-        if not self.text:
+        if self.ids is None and not self.text:
             logger.error(f'{colorize("No text passed", "FAIL")}')
             return
 
+        ids = self.ids if self.ids is not None else CorpusCache.encode(self.text, self.vocab)  # type: ignore
+        if self.stateful and self.modelType.startswith('BiLSTM'):
+            logger.warning(colorize('Bidirectional models can\'t be trained statefully.', 'WARNING'))
+            self.stateful = False
+        strategy = getStrategy()
+        if strategy.num_replicas_in_sync == 1:
+            self.dataset = self.makePipelineDataset(ids, 1, 0)
+        elif self.stateful:
+            raise ValueError('Stateful training can\'t be distributed.')
+        else:
+            # repeated, the epochs are counted in steps instead
+            self.dataset = strategy.distribute_datasets_from_function(
+                lambda context: self.makePipelineDataset(
+                    ids, context.num_input_pipelines, context.input_pipeline_id
+                ).repeat()
+            )
+            self.stepsPerEpoch = len(self.getSequences(ids)) // (self.batchSize * strategy.num_replicas_in_sync)
+            logger.info(f'Global batch size {self.batchSize * strategy.num_replicas_in_sync}')
+        logger.debug(f'{colorize("Dataset created", "OKGREEN")}')
+
+    def makePipelineDataset(self, ids: np.ndarray, pipelineCount: int, pipelineIndex: int) -> tf.data.Dataset:
+        """
+        Create the dataset of one input pipeline, reading every pipelineCount-th sequence.
+        """
+
         def splitInputTarget(sequence):
-            input = sequence[:-1]
-            target = sequence[1:]
+            input = sequence[..., :-1]
+            target = sequence[..., 1:]
             return input, target
 
-        allIDs = self.charToID(tf.strings.unicode_split(self.text, 'UTF-8'))
-        sequences = tf.data.Dataset.from_tensor_slices(allIDs)
-        sequences = sequences.batch(self.seqLength + 1, drop_remainder=True)
-        self.dataset = sequences.map(splitInputTarget)
-        self.dataset = (
-            self.dataset.shuffle(self.bufferSize)
+        if self.stateful:
+            dataset = self.makeStreamBatches(ids).map(splitInputTarget)
+        elif self.datasetFormat == 'tfrecord':
+            dataset = (
+                self.makeTFRecordSequences(ids, pipelineCount, pipelineIndex)
+                .shuffle(self.bufferSize)
+                .batch(self.batchSize, drop_remainder=True)
+                .map(splitInputTarget)
+            )
+        else:
+            dataset = self.makeMemmapBatches(ids, pipelineCount, pipelineIndex).map(splitInputTarget)
+        return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+    def getSequences(self, ids: np.ndarray) -> np.ndarray:
+        """
+        View the IDs as sequences of seqLength + 1 characters, the rest is dropped. Memory maps stay memory maps.
+        """
+        count = len(ids) // (self.seqLength + 1)
+        return ids[: count * (self.seqLength + 1)].reshape(count, self.seqLength + 1)
+
+    def makeMemmapBatches(self, ids: np.ndarray, pipelineCount: int = 1, pipelineIndex: int = 0) -> tf.data.Dataset:
+        """
+        Batches of sequences read from the IDs. Only the shuffled sequence indices go through tf.data,
+        each batch is read from the IDs with one call, the IDs are never loaded as a whole.
+        """
+        sequences = self.getSequences(ids)
+
+        def readBatch(indices):
+            # sorted for sequential reads, the order within a batch doesn't matter
+            return np.asarray(sequences[np.sort(indices)])
+
+        def loadBatch(indices):
+            batch = tf.numpy_function(readBatch, [indices], tf.as_dtype(sequences.dtype))
+            batch = tf.ensure_shape(batch, [self.batchSize, self.seqLength + 1])
+            return tf.cast(batch, tf.int64)
+
+        return (
+            tf.data.Dataset.range(len(sequences))
+            .shard(pipelineCount, pipelineIndex)
+            .shuffle(self.bufferSize)
             .batch(self.batchSize, drop_remainder=True)
-            .prefetch(tf.data.experimental.AUTOTUNE)
+            .map(loadBatch, num_parallel_calls=tf.data.experimental.AUTOTUNE)
         )
-        logger.debug(f'{colorize("Dataset created", "OKGREEN")}')
+
+    def makeStreamBatches(self, ids: np.ndarray) -> tf.data.Dataset:
+        """
+        Batches for stateful training. The IDs are split into batchSize contiguous streams, row i of every batch
+        continues row i of the previous batch, so the states at the end of a batch are the initial states of the next.
+        """
+        streamLength = len(ids) // self.batchSize
+        streams = ids[: streamLength * self.batchSize].reshape(self.batchSize, streamLength)
+
+        def readBatch(step):
+            start = step * self.seqLength
+            return np.asarray(streams[:, start : start + self.seqLength + 1])
+
+        def loadBatch(step):
+            batch = tf.numpy_function(readBatch, [step], tf.as_dtype(streams.dtype))
+            batch = tf.ensure_shape(batch, [self.batchSize, self.seqLength + 1])
+            return tf.cast(batch, tf.int64)
+
+        # consecutive characters overlap by one, the last target of a batch is the first input of the next
+        return tf.data.Dataset.range((streamLength - 1) // self.seqLength).map(loadBatch)
+
+    def writeTFRecords(self, ids: np.ndarray, pipelineCount: int = 1, pipelineIndex: int = 0) -> str:
+        """
+        Write the sequences of the IDs round robin to TFRecord shards, one raw record per sequence.
+        With several input pipelines, every pipeline writes its own sequences to its own directory.
+
+        :return: The file pattern of the shards.
+        """
+        directory = path.join(self.tfrecordPath, self.runName)
+        if pipelineCount > 1:
+            directory = path.join(directory, f'pipeline{pipelineIndex}')
+        makedirs(directory, exist_ok=True)
+        for fileName in glob(path.join(directory, 'shard-*.tfrecord')):
+            remove(fileName)
+        sequences = self.getSequences(ids)[pipelineIndex::pipelineCount]
+        writers = [
+            tf.io.TFRecordWriter(path.join(directory, f'shard-{i:03d}.tfrecord')) for i in range(self.tfrecordShards)
+        ]
+        chunkSize = 10000
+        for start in range(0, len(sequences), chunkSize):
+            # uint32 is not supported by decode_raw, the IDs always fit in int32
+            chunk = np.asarray(sequences[start : start + chunkSize])
+            chunk = chunk.astype(np.int32) if chunk.dtype == np.uint32 else chunk
+            for i, sequence in enumerate(chunk, start):
+                writers[i % self.tfrecordShards].write(sequence.tobytes())
+        for writer in writers:
+            writer.close()
+        logger.debug(f'Wrote {len(sequences)} sequences to {self.tfrecordShards} TFRecord shards in {directory}')
+        return path.join(directory, 'shard-*.tfrecord')
+
+    def makeTFRecordSequences(
+        self, ids: np.ndarray, pipelineCount: int = 1, pipelineIndex: int = 0
+    ) -> tf.data.Dataset:
+        """
+        Sequences read from TFRecord shards of the IDs, interleaving the shards in parallel.
+        The parsed sequences are snapshotted to snapshotPath if set, later epochs and runs read the snapshot.
+        """
+        pattern = self.writeTFRecords(ids, pipelineCount, pipelineIndex)
+        recordType = tf.int32 if ids.dtype == np.uint32 else tf.as_dtype(ids.dtype)
+
+        def parseSequence(record):
+            sequence = tf.io.decode_raw(record, recordType)
+            return tf.cast(tf.ensure_shape(sequence, [self.seqLength + 1]), tf.int64)
+
+        sequences = tf.data.Dataset.list_files(pattern, shuffle=True).interleave(
+            tf.data.TFRecordDataset,
+            cycle_length=self.tfrecordShards,
+            num_parallel_calls=tf.data.experimental.AUTOTUNE,
+            deterministic=False,
+        )
+        sequences = sequences.map(parseSequence, num_parallel_calls=tf.data.experimental.AUTOTUNE)
+        if self.datasetSnapshotPath:
+            snapshotPath = path.join(self.datasetSnapshotPath, self.runName)
+            if pipelineCount > 1:
+                snapshotPath = path.join(snapshotPath, f'pipeline{pipelineIndex}')
+            sequences = sequences.snapshot(snapshotPath)
+        return sequences
 
     def makeModel(self) -> None:
         """
@@ -113,18 +280,41 @@ class TrustedRNN:
         if self.modelType == 'LSTM_multilayer' or self.modelType == 'BiLSTM_multilayer':
             layers = self.layers
             logger.debug(f'Calling dynamic models with {layers} layers')
-        self.model = self.RNNModel(
-            len(self.charToID.get_vocabulary()),
-            self.embeddingSize,
-            self.nUnits,
-            layers=layers,
-        )
-        self.model.build(input_shape=(self.batchSize, self.seqLength))
-        if self.printSummary:
-            self.model.summary()
-        self.model.compile(optimizer=self.optimizer, loss=self.loss(), metrics=['accuracy'])
+        policy = self.getPrecisionPolicy()
+        tf.keras.mixed_precision.set_global_policy(policy)
+        if policy != 'float32':
+            logger.info(f'{colorize("Using mixed precision", "OKBLUE")} {policy}')
+        with getStrategy().scope():
+            self.model = self.RNNModel(
+                len(self.charToID.get_vocabulary()),
+                self.embeddingSize,
+                self.nUnits,
+                layers=layers,
+            )
+            self.model.build(input_shape=(self.batchSize, self.seqLength))
+            if self.printSummary:
+                self.model.summary()
+            self.model.compile(
+                optimizer=self.optimizer, loss=self.loss(), metrics=['accuracy'], jit_compile=self.jitCompile
+            )
         logger.debug(f'{colorize("Model created", "OKGREEN")}')
 
+    def getPrecisionPolicy(self) -> str:
+        """
+        Get the Keras dtype policy for the mixedPrecision option. 'auto' uses mixed_float16 on GPUs,
+        mixed_bfloat16 on CPUs with bfloat16 instructions and float32 otherwise.
+        """
+        if self.mixedPrecision != 'auto':
+            return self.mixedPrecision or 'float32'
+        if tf.config.list_physical_devices('GPU'):
+            return 'mixed_float16'
+        try:
+            with open('/proc/cpuinfo', 'r') as f:
+                flags = f.read()
+        except OSError:
+            return 'float32'
+        return 'mixed_bfloat16' if 'avx512_bf16' in flags or 'amx_bf16' in flags else 'float32'
+
     def loss(self):
         """
         Define the loss function for the model.
@@ -158,12 +348,28 @@ class TrustedRNN:
         """
         Returns the callback for tensorboard.
         """
+        profileBatches = config['training']['telemetry']['profileBatches']
         return tf.keras.callbacks.TensorBoard(
             log_dir=f'tb_logs/{self.runName}',
-            histogram_freq=1,
+            histogram_freq=config['training']['telemetry']['histogramFreq'],
             write_graph=True,
             write_images=False,
             update_freq='epoch',
+            profile_batch=tuple(profileBatches) if profileBatches[1] else 0,
+        )
+
+    def throughputCallback(self):
+        """
+        Returns the callback recording the training throughput.
+        """
+        replicas = getStrategy().num_replicas_in_sync
+        return ThroughputCallback(
+            self.batchSize * self.seqLength * replicas,
+            f'tb_logs/{self.runName}',
+            config['training']['telemetry']['summaryFile'].replace('{runName}', self.runName),
+            # distributed datasets aren't probed
+            dataset=self.dataset if replicas == 1 else None,
+            probeSteps=config['training']['telemetry']['probeSteps'],
         )
 
     def getCallbacks(self) -> List[Any]:
@@ -175,6 +381,9 @@ class TrustedRNN:
         if config['training']['earlyStopping']['useEarlyStopping']:
             callbacks.append(self.earlyStoppingCallback())
         callbacks.append(self.tensorboardCallback())
+        if config['training']['telemetry']['useThroughputCallback']:
+            callbacks.append(self.throughputCallback())
+        callbacks += self.extraCallbacks
         return callbacks
 
     def trainModel(self) -> None:
@@ -185,13 +394,63 @@ class TrustedRNN:
             logger.error(f'{colorize("Model or dataset not created", "FAIL")}')
             return
         logger.info(f'{colorize("Training model", "OKBLUE")} {self.runName}')
+        if self.stateful:
+            self.trainStateful()
+            return
         self.history = self.model.fit(
             self.dataset,
             epochs=self.nEpochs,
+            steps_per_epoch=self.stepsPerEpoch,
             callbacks=[self.getCallbacks()],
             verbose=self.verbose,
         )
 
+    def trainStateful(self) -> None:
+        """
+        Trains the model with truncated backpropagation through time. The states at the end of every batch are the
+        initial states of the next one, without gradients flowing back through them. They are reset every epoch.
+        """
+        callbacks = tf.keras.callbacks.CallbackList(
+            self.getCallbacks(),
+            add_history=True,
+            add_progbar=self.verbose != 0,
+            model=self.model,
+            verbose=self.verbose,
+            epochs=self.nEpochs,
+            steps=int(self.dataset.cardinality()),  # type: ignore
+        )
+        trainStep = tf.function(self.statefulTrainStep, jit_compile=self.jitCompile)
+        self.model.stop_training = False  # type: ignore
+        logs: Dict[str, Any] = {}
+        callbacks.on_train_begin()
+        for epoch in range(self.nEpochs):
+            self.model.reset_metrics()  # type: ignore
+            callbacks.on_epoch_begin(epoch)
+            states = None
+            for step, (inputs, targets) in enumerate(self.dataset):  # type: ignore
+                callbacks.on_train_batch_begin(step)
+                logs, states = trainStep(inputs, targets, states)
+                callbacks.on_train_batch_end(step, logs)
+            logs = {name: float(value) for name, value in logs.items()}
+            callbacks.on_epoch_end(epoch, logs)
+            if self.model.stop_training:  # type: ignore
+                break
+        callbacks.on_train_end(logs)
+        self.history = self.model.history  # type: ignore
+
+    def statefulTrainStep(self, inputs, targets, states) -> Tuple[Dict[str, Any], Any]:
+        """
+        Train on one batch starting from the given states, None for the initial states.
+
+        :return: The metrics and the final states of the batch.
+        """
+        with tf.GradientTape() as tape:
+            logits, states = self.model(inputs, states=states, returnState=True, training=True)  # type: ignore
+            loss = self.model.compute_loss(inputs, targets, logits)  # type: ignore
+        self.model.optimizer.minimize(loss, self.model.trainable_variables, tape=tape)  # type: ignore
+        metrics = self.model.compute_metrics(inputs, targets, logits, None)  # type: ignore
+        return metrics, mapStates(tf.stop_gradient, states)
+
     def saveModelWeights(self, filename: str) -> None:
         """
         Saves the model weights to a file.
@@ -201,6 +460,11 @@ class TrustedRNN:
         if not self.model:
             logger.error(f'{colorize("Model not created", "FAIL")}')
             return
+        if not isChief():
+            # every worker has to take part in saving, only the chief keeps the weights
+            with TemporaryDirectory() as directory:
+                self.model.save_weights(path.join(directory, filename))
+            return
         filepath = path.join(self.checkpointPath, filename)
         self.model.save_weights(filepath)
         logger.debug(f'{colorize("Model weights saved", "OKBLUE")}')
@@ -238,37 +502,178 @@ class TrustedRNN:
             string = 'History doesn\'t exist, train the model first'
             logger.error(f'{colorize(string, "FAIL")}')
             return
+        if not isChief():
+            # pickling the history pickles the model, which every worker has to take part in
+            with TemporaryDirectory() as directory, open(path.join(directory, filename), 'wb') as f:
+                dump(self.history, f)
+            return
         with open(filename, 'wb') as f:
             dump(self.history, f)
 
-    def predict(self, seed: str, temperature: Optional[float] = None) -> str:
+    def predictBatch(
+        self,
+        seeds: Union[str, List[str]],
+        temperatures: Union[None, float, List[Optional[float]]] = None,
+        n: int = 1,
+    ) -> List[str]:
         """
-        Predict text based on seed using temperature.
+        Predict n texts for every seed, running all of them as a single batch.
 
-        :param str seed: The seed to use for prediction.
-        :param float temperature: The temperature to use for prediction.
+        :param seeds: The seed or list of seeds to use for prediction.
+        :param temperatures: The temperature for all seeds or a list with one temperature per seed.
+        :param int n: The number of predictions per seed.
+        :return: The predictions, n consecutive entries per seed.
         """
         if not self.predictor:
             logger.error(f'{colorize("No predictor found, make predictor first", "FAIL")}')
-            return ''
-        seed = seed.lower()
-        states = None
-        nextChar = tf.constant([seed])
-        result = []
-
-        for _ in range(self.maxPredictionLength):
-            nextChar, states = self.predictor.predictNextChar(nextChar, states, temperature=temperature)  # type: ignore # noqa: E501
-            result.append(nextChar)
-            if nextChar == '\n':
-                if len(result) > 3 and (seed + tf.strings.join(result))[0].numpy().decode('utf-8').strip():
-                    break
-                else:
-                    seed = ''
-                    result = []
-            # maximum discord message length is 2000
-            if len(seed) + len(result) >= 1999:
-                break
+            return [''] * (1 if isinstance(seeds, str) else len(seeds)) * n
+        return super().predictBatch(seeds, temperatures, n)
+
+    def decode(self, rows: List[GeneratedMessage]) -> None:
+        """
+        Generate the given rows, using the compiled decode loop if enabled.
+        The compiled loop feeds the seeds one character at a time, so it is only used for models with resumable states.
+
+        :param rows: The rows to generate.
+        """
+        if self.compiledDecode and self.resumableStates:
+            self.decodeCompiled(rows)
+        else:
+            self.decodeRows(rows)
+
+    def decodeCompiled(self, rows: List[GeneratedMessage]) -> None:
+        """
+        Generate the given rows in a single call to the compiled decode loop of the predictor.
+
+        :param rows: The rows to generate.
+        """
+        seedChars = tf.strings.unicode_split([row.seed for row in rows], 'UTF-8')
+        # without banned words the automaton has a single state that allows everything
+        automaton = self.bannedWords or BannedWordAutomaton([], self.getVocabulary())
+        texts, keepSeed = self.predictor.generate(  # type: ignore
+            self.charToID(seedChars).to_tensor(),
+            tf.cast(seedChars.row_lengths(), tf.int32),
+            tf.constant([row.hasContent for row in rows]),
+            tf.constant([row.temperature for row in rows], dtype=tf.float32),
+            tf.constant(self.maxPredictionLength),
+            tf.constant(automaton.transitions),
+            tf.constant(automaton.masks),
+            tf.constant(automaton.startStates([row.seed for row in rows])),
+        )
+        for row, text, keep in zip(rows, texts.numpy(), keepSeed.numpy()):
+            row.setResult(text.decode('utf-8'), bool(keep))
+
+    def feedSeed(self, seed: str, states: Any) -> Tuple[Any, Any]:
+        """
+        Feed a single seed.
+
+        :param str seed: The seed.
+        :param states: The states to start from, None for the initial states.
+        :return: The logits after the seed and the states, both with a batch size of one.
+        """
+        return self.predictor.feed(tf.constant([seed]), states)  # type: ignore
+
+    def sampleRows(self, logits: Any, temperatures: List[float], masks: Any = None) -> List[str]:
+        """
+        Sample one character per row from the logits, masks are added to the logits if given.
+        """
+        temperature = tf.constant([[temperature] for temperature in temperatures], dtype=tf.float32)
+        predictedChars = self.predictor.sample(logits, temperature, mask=masks)  # type: ignore
+        return [char.decode('utf-8') for char in predictedChars.numpy()]
+
+    def stepRows(
+        self, chars: List[str], states: Any, temperatures: List[float], masks: Any = None
+    ) -> Tuple[List[str], Any]:
+        """
+        Feed one character per row and predict the next ones.
+
+        :param chars: The last character of every row.
+        :param states: The states of the rows.
+        :param temperatures: The temperature of every row.
+        :param masks: Added to the logits of every row before sampling, if given.
+        :return: The predicted characters and the new states.
+        """
+        temperature = tf.constant([[temperature] for temperature in temperatures], dtype=tf.float32)
+        nextChars, states = self.predictor.predictNextChar(  # type: ignore
+            tf.constant(chars), states, temperature=temperature, mask=masks
+        )
+        return [char.decode('utf-8') for char in nextChars.numpy()], states
 
-        result = (seed + tf.strings.join(result))[0].numpy().decode('utf-8').strip()
-        logger.debug(f'{colorize("Prediction:", "OKGREEN")} {colorize(result, "OKCYAN")}')
-        return result
+    def selectStates(self, states: Any, indices: List[int]) -> Any:
+        """
+        Select the states of the given rows.
+        """
+        return mapStates(lambda state: tf.gather(state, indices), states)
+
+    def concatStates(self, states: List[Any]) -> Any:
+        """
+        Concatenate the states of several batches.
+        """
+        if len(states) == 1:
+            return states[0]
+        return mapStates(lambda *state: tf.concat(state, 0), *states)
+
+    def getVocabulary(self) -> List[str]:
+        return self.charToID.get_vocabulary()
+
+    def memoryBytes(self) -> int:
+        """
+        Approximate memory used by the weights of the model in bytes.
+        """
+        if not self.model:
+            return 0
+        return sum(weight.shape.num_elements() * weight.dtype.size for weight in self.model.weights)
+
+    def exportNumpyWeights(self, fileName: str, quantize: bool = False) -> None:
+        """
+        Export the weights and vocabulary to a single array file for the NumPy engine.
+
+        :param str fileName: The file to write to.
+        :param bool quantize: Store the weight matrices as int8 with per-column scales.
+        """
+        if not self.model:
+            logger.error(f'{colorize("Model not created", "FAIL")}')
+            return
+        if self.modelType not in NumpyPredictor.supportedModelTypes:
+            logger.error(f'{colorize(f"{self.modelType} is not supported by the NumPy engine", "FAIL")}')
+            return
+        rnnLayers = [
+            layer for layer in self.model.layers if isinstance(layer, (tf.keras.layers.GRU, tf.keras.layers.LSTM))
+        ]
+        arrays = {
+            'modelType': np.array(self.modelType),
+            'vocabulary': np.array(self.charToID.get_vocabulary()),
+            'embedding': self.model.embedding.get_weights()[0],
+            'dense/kernel': self.model.dense.get_weights()[0],
+            'dense/bias': self.model.dense.get_weights()[1],
+        }
+        for i, layer in enumerate(rnnLayers):
+            if isinstance(layer, tf.keras.layers.GRU) and not layer.reset_after:
+                logger.error(f'{colorize("Only GRU layers with reset_after are supported", "FAIL")}')
+                return
+            kernel, recurrentKernel, bias = layer.get_weights()
+            arrays[f'rnn{i}/kernel'] = kernel
+            arrays[f'rnn{i}/recurrentKernel'] = recurrentKernel
+            arrays[f'rnn{i}/bias'] = bias
+        if quantize:
+            # the input kernel of the first layer is folded into a lookup table when loaded, it stays float
+            names = [name for name in arrays if name.endswith(('/kernel', '/recurrentKernel'))]
+            names.remove('rnn0/kernel')
+            for name in names:
+                matrix = QuantizedMatrix.quantize(arrays[name])
+                arrays[name] = matrix.values
+                arrays[f'{name}/scales'] = matrix.scales
+        np.savez(fileName, **arrays)
+        logger.debug(f'{colorize("NumPy weights exported", "OKBLUE")}')
+
+    def exportSavedModel(self, directory: str) -> None:
+        """
+        Export the model with its vocabulary as a SavedModel for the savedmodel engine.
+
+        :param str directory: The directory to write to.
+        """
+        if not self.model:
+            logger.error(f'{colorize("Model not created", "FAIL")}')
+            return
+        ServingModule(self.model, self.charToID.get_vocabulary(), self.modelType).save(directory)
+        logger.debug(f'{colorize("SavedModel exported", "OKBLUE")}')
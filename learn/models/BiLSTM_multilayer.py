@@ -12,7 +12,7 @@ class RNNModel(Model):
         self.lstm = []
         for _ in range(self.layerCount):
             self.lstm.append(Bidirectional(LSTM(nUnits, return_sequences=True, return_state=True)))
-        self.dense = Dense(vocabSize)
+        self.dense = Dense(vocabSize, dtype='float32')  # logits stay float32 with mixed precision
 
     def call(self, inputs, states=None, returnState=False, training=False):
         outState = []
@@ -8,7 +8,7 @@ class RNNModel(Model):
         self.embedding = Embedding(vocabSize, embeddingSize)
         self.gru_1 = GRU(nUnits, return_sequences=True, return_state=True)
         self.gru_2 = GRU(nUnits, return_sequences=True, return_state=True)
-        self.dense = Dense(vocabSize)
+        self.dense = Dense(vocabSize, dtype='float32')  # logits stay float32 with mixed precision
 
     def call(self, inputs, states=None, returnState=False, training=False):
         x = self.embedding(inputs, training=training)
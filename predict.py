@@ -1,7 +1,5 @@
 import sys
 
-from tqdm import tqdm
-
 from bot.PredictionGetter import PredictionGetter
 from utils.configReader import readConfig
 from utils.setupLogger import setupLogger
@@ -28,10 +26,8 @@ seed = '\n'
 
 # set up model
 
-model = PredictionGetter.makeModel(**modelDict)
-predictions = []
-for _ in tqdm(range(100)):
-    predictions.append(model.predict(seed))
+model = PredictionGetter().buildModel(modelDict)
+predictions = model.predictBatch(seed, n=100)
 
 for el in predictions:
     print(el)
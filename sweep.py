@@ -0,0 +1,10 @@
+from learn.SweepRunner import SweepRunner
+from utils.setupLogger import setupLogger
+from utils.configReader import readConfig
+
+config = readConfig()
+
+# the trial processes import this file again, only the main process runs the sweep
+if __name__ == '__main__':
+    setupLogger('ai', config['learn']['run']['logLevel'])
+    SweepRunner().run()
@@ -0,0 +1,12 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# the modules read config.json from the working directory when they are imported,
+# fall back to the example config when the tests don't run from a configured checkout
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+if not os.path.exists('config.json'):
+    os.chdir(tempfile.mkdtemp())
+    shutil.copy(os.path.join(root, 'config_example.json'), 'config.json')
@@ -0,0 +1,20 @@
+import pytest
+import tensorflow as tf
+
+from learn.TrustedRNN import TrustedRNN
+
+vocab = sorted(set('abcdefghijklmnopqrstuvwxyz .,!?\n'))
+seeds = ['hello there', 'a', 'the quick brown fox jumps']
+
+
+@pytest.mark.parametrize('modelType', ['GRU_1layer', 'GRU_2layer', 'LSTM_1layer'])
+def test_compiledMatchesLoop(modelType: str) -> None:
+    tf.random.set_seed(1)
+    rnn = TrustedRNN(vocab, modelType=modelType, nUnits=32, embeddingSize=8, maxPredictionLength=40)
+    rnn.makeModel()
+    rnn.makePredictor()
+    # a low temperature makes sampling pick the most likely character, so both decodes sample the same
+    rnn.compiledDecode = True
+    compiled = rnn.predictBatch(seeds, 1e-6)
+    rnn.compiledDecode = False
+    assert compiled == rnn.predictBatch(seeds, 1e-6)
@@ -0,0 +1,79 @@
+import itertools
+import random
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from learn import DataProcessor
+from learn.FilterPlan import FilterPlan
+
+flags = [
+    'onlyLowercase',
+    'filterDiscordEmotes',
+    'filterVanillaEmoji',
+    'filterMentions',
+    'filterChannels',
+    'filterLinks',
+    'filterMarkdown',
+    'onlyKeepAllowedChars',
+    'filterCustomChars',
+]
+# pieces of messages that the filters match, or almost match
+tokens = [
+    'hello', 'World', ' ', ' ', '\n', '""', '"', "'", '?', 'ÄÖü', 'ß', '\x00', '\t',
+    '*', '**', '***', '~~', '__', '||', '`', '```', '* ', '_',
+    '<:pog:123456789012345678>', '<a:pog_2:123456789012345678>', '<:pog:12345>',
+    '<@123456789012345678>', '<@!123456789012345678>', '<#123456789012345678>', '<@1234>',
+    'https://www.example.com/a?b=c&d=e', '<http://example.org>', 'http://x', 'www.example.com',
+    '©', '®', '•', '　', '😀', '🙂', '🤖',
+]
+
+
+def randomMessage(rng: random.Random) -> str:
+    return ''.join(rng.choice(tokens) for _ in range(rng.randint(0, 12)))
+
+
+def makeSettings(enabled: Dict[str, bool]) -> Dict[str, Any]:
+    settings: Dict[str, Any] = dict(DataProcessor.config['learn']['data'])
+    settings.update(enabled)
+    settings['bannedChars'] = 'aeiou*'
+    return settings
+
+
+def combinations() -> List[Dict[str, bool]]:
+    rng = random.Random(0)
+    everyCombination = [dict(zip(flags, values)) for values in itertools.product([False, True], repeat=len(flags))]
+    return everyCombination[:1] + everyCombination[-1:] + rng.sample(everyCombination[1:-1], 40)
+
+
+@pytest.mark.parametrize('enabled', combinations())
+def test_applyMatchesFilterString(monkeypatch: pytest.MonkeyPatch, enabled: Dict[str, bool]) -> None:
+    settings = makeSettings(enabled)
+    monkeypatch.setitem(DataProcessor.config['learn'], 'data', settings)
+    rng = random.Random(str(enabled))
+    plan = FilterPlan(settings)
+    for withNullChars in [False, True]:
+        messages: List[Any] = [randomMessage(rng) for _ in range(200)]
+        if not withNullChars:
+            messages = [message.replace('\x00', '') for message in messages]
+        messages[rng.randrange(len(messages))] = np.nan
+        messages[rng.randrange(len(messages))] = None
+        contents = pd.Series(messages, index=range(10, 10 + len(messages)), name='Contents')
+
+        result = plan.apply(contents)
+
+        expected = [DataProcessor.DataProcessor.filterString(message) for message in messages]
+        assert result.index.equals(contents.index)
+        assert result.name == contents.name
+        for value, expectedValue in zip(result.tolist(), expected):
+            if isinstance(expectedValue, str):
+                assert value == expectedValue
+            else:
+                assert value is expectedValue or (pd.isna(value) and pd.isna(expectedValue))
+
+
+def test_emptyColumn() -> None:
+    plan = FilterPlan(makeSettings({flag: True for flag in flags}))
+    assert plan.apply(pd.Series([], dtype=object)).empty
@@ -1,9 +1,20 @@
+import os
+import sys
+
 from learn.Trainer import Trainer
+from utils.distribution import launchLocalWorkers
 from utils.setupLogger import setupLogger
 from utils.configReader import readConfig
 
 config = readConfig()
 setupLogger('ai', config['learn']['run']['logLevel'])
 
+distributionSettings = config['learn']['training']['distribution']
+isMultiWorker = distributionSettings['strategy'] == 'multiworker'
+if isMultiWorker and distributionSettings['localWorkers'] and 'TF_CONFIG' not in os.environ:
+    # process the corpus once, the workers all load it from the corpus cache
+    Trainer().loadCorpus()
+    sys.exit(launchLocalWorkers(distributionSettings['localWorkers']))
+
 trainer = Trainer()
 trainer.run()
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+from typing import Any, List, Tuple
+
+from utils.configReader import readConfig
+from utils.colorizer import colorize
+
+config = readConfig()
+logger = logging.getLogger('ai.utils.distribution')
+
+strategy: Any = None
+
+
+def getStrategy() -> Any:
+    """
+    Get the tf.distribute strategy selected in config, created on first use.
+    When training on multiple workers this has to be called before any other TensorFlow operation.
+    """
+    global strategy
+    if strategy is None:
+        import tensorflow as tf
+
+        name = config['learn']['training']['distribution']['strategy']
+        if name == 'multiworker':
+            strategy = tf.distribute.MultiWorkerMirroredStrategy()
+        elif name == 'mirrored':
+            strategy = tf.distribute.MirroredStrategy()
+        else:
+            strategy = tf.distribute.get_strategy()
+        logger.info(
+            f'{colorize("Distribution strategy", "OKBLUE")} {name} with {strategy.num_replicas_in_sync} replicas'
+        )
+    return strategy
+
+
+def getTask() -> Tuple[str, int]:
+    """
+    Get the type and index of this task from TF_CONFIG, a single worker if it isn't set.
+    """
+    task = json.loads(os.environ.get('TF_CONFIG', '{}')).get('task', {})
+    return task.get('type', 'worker'), int(task.get('index', 0))
+
+
+def isChief() -> bool:
+    """
+    Whether this task writes the results of the training, the chief or else the first worker.
+    """
+    cluster = json.loads(os.environ.get('TF_CONFIG', '{}')).get('cluster', {})
+    taskType, taskIndex = getTask()
+    if 'chief' in cluster:
+        return taskType == 'chief'
+    return taskType == 'worker' and taskIndex == 0
+
+
+def getFreePorts(count: int) -> List[int]:
+    sockets = [socket.socket() for _ in range(count)]
+    for s in sockets:
+        s.bind(('localhost', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def launchLocalWorkers(count: int) -> int:
+    """
+    Run the current script in count local worker processes with a TF_CONFIG for a local cluster.
+    Used to train on all cores of one machine or to test multi-worker training.
+
+    :return: The highest exit code of the workers.
+    """
+    workers = [f'localhost:{port}' for port in getFreePorts(count)]
+    processes = []
+    for index in range(count):
+        taskConfig = {'cluster': {'worker': workers}, 'task': {'type': 'worker', 'index': index}}
+        environment = dict(os.environ, TF_CONFIG=json.dumps(taskConfig))
+        processes.append(subprocess.Popen([sys.executable] + sys.argv, env=environment))
+    logger.info(f'{colorize("Started", "OKBLUE")} {count} local workers on {", ".join(workers)}')
+    return max(process.wait() for process in processes)
@@ -0,0 +1,20 @@
+import glob
+from typing import List
+
+from utils.configReader import readConfig
+
+config = readConfig()
+
+
+def getInputFiles() -> List[str]:
+    """
+    Get the training data files matched by the globs specified in config, in a stable order.
+    If an input database is specified, it is the only input file.
+    """
+    if config['learn']['data']['inputDatabase']:
+        return [config['learn']['data']['inputDatabase']]
+    return [
+        fileName
+        for fileGlob in config['learn']['data']['inputFiles']
+        for fileName in sorted(glob.glob(f'data\\{fileGlob}'))
+    ]
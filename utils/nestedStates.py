@@ -0,0 +1,19 @@
+from typing import Any, Callable, List
+
+
+def mapStates(function: Callable[..., Any], *states: Any) -> Any:
+    """
+    Apply a function to every tensor of one or more RNN states with the same (possibly nested) layout.
+    """
+    if isinstance(states[0], (list, tuple)):
+        return [mapStates(function, *inner) for inner in zip(*states)]
+    return function(*states)
+
+
+def flattenStates(states: Any) -> List[Any]:
+    """
+    Get all tensors of a (possibly nested) RNN state as a flat list.
+    """
+    if isinstance(states, (list, tuple)):
+        return [tensor for inner in states for tensor in flattenStates(inner)]
+    return [states]
@@ -7,3 +7,12 @@ def convertSnowflake(snowflake: int) -> datetime.datetime:
     """
     converted = datetime.datetime.fromtimestamp(((snowflake >> 22) + 1420070400000)/1000, datetime.timezone.utc)
     return converted
+
+
+def toSnowflake(date: datetime.datetime) -> int:
+    """
+    Converts a datetime object to the smallest discord snowflake of that time, naive datetimes are taken as UTC
+    """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return (int(date.timestamp() * 1000) - 1420070400000) << 22